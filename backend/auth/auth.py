@@ -1,45 +1,171 @@
 from datetime import datetime, timedelta
 from typing import Optional, List
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from cachetools import TTLCache
+import jwt
+from jwt import InvalidTokenError as JWTError
+import bcrypt
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from models import User, TokenData
+from database.repository import db
 import uuid
 
 # Security configuration
 SECRET_KEY = "monzo-demo-secret-key-change-in-production"
+SECRET_KEY_BYTES = SECRET_KEY.encode("utf-8")  # encoded once, reused for every HMAC
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# bcrypt cost is 2^rounds: 12 -> 10 is ~4x faster, 12 -> 4 is ~256x. Keep 12 in
+# production and lower BCRYPT_ROUNDS only for local/demo environments. Hashes
+# below the configured cost are upgraded on login.
+BCRYPT_ROUNDS = max(int(os.getenv("BCRYPT_ROUNDS", "12")), 4)
+
+# Verified against when an email is unknown, to keep login timing constant.
+# Built on first use rather than at import so startup doesn't pay for a hash.
+_DUMMY_HASH: Optional[bytes] = None
+_dummy_hash_lock = threading.Lock()
+
 security = HTTPBearer()
 
+# Verified tokens, keyed by SHA-256 of the raw token and stored with their exp
+# claim, which is re-checked on every hit so a cached token still expires on time.
+TOKEN_CACHE_TTL_SECONDS = 30
+_tok_cache = TTLCache(maxsize=10000, ttl=TOKEN_CACHE_TTL_SECONDS)
+_tok_cache_lock = threading.Lock()
+
+# Users resolved by get_current_user, keyed by the same token hash. Tokens are
+# still verified first, so an expired token never reaches this cache. Code that
+# writes a user row calls invalidate_cached_user; anything else may see a User up
+# to 60s stale.
+_user_cache = TTLCache(maxsize=5000, ttl=60)
+_user_cache_lock = threading.Lock()
+
+def _token_key(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    try:
+        return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
+    except ValueError:
+        # Malformed or non-bcrypt hash
+        return False
 
 def get_password_hash(password: str) -> str:
-    return pwd_context.hash(password)
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(BCRYPT_ROUNDS)).decode()
+
+def _get_dummy_hash() -> bytes:
+    global _DUMMY_HASH
+    if _DUMMY_HASH is None:
+        with _dummy_hash_lock:
+            if _DUMMY_HASH is None:
+                _DUMMY_HASH = bcrypt.hashpw(b"dummy", bcrypt.gensalt(BCRYPT_ROUNDS))
+    return _DUMMY_HASH
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    """True if the hash was made with a lower cost than BCRYPT_ROUNDS"""
+    try:
+        return int(hashed_password.split("$")[2]) < BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+def _b64url_decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+# The JOSE header never changes, so it is serialized and encoded once
+_HEADER_B64 = _b64url(b'{"alg":"HS256","typ":"JWT"}')
+
+# Keyed HMAC state; .copy() per token skips re-deriving the key pads
+_HMAC_PROTO = hmac.new(SECRET_KEY_BYTES, digestmod=hashlib.sha256)
+
+def _sign(signing_input: str) -> bytes:
+    mac = _HMAC_PROTO.copy()
+    mac.update(signing_input.encode())
+    return mac.digest()
+
+def _decode_token(token: str) -> Optional[dict]:
+    """Verify an HS256 token carrying our fixed header and return its claims"""
+    header_b64, _, rest = token.partition(".")
+    if header_b64 != _HEADER_B64:
+        # Not one of ours in the common shape, let PyJWT decide
+        try:
+            return jwt.decode(token, SECRET_KEY_BYTES, algorithms=[ALGORITHM])
+        except JWTError:
+            return None
+
+    payload_b64, _, signature_b64 = rest.partition(".")
+    try:
+        signature = _b64url_decode(signature_b64)
+        if not hmac.compare_digest(_sign(f"{header_b64}.{payload_b64}"), signature):
+            return None
+        payload = json.loads(_b64url_decode(payload_b64))
+    except ValueError:
+        return None
+    if not isinstance(payload, dict):
+        return None
+
+    exp = payload.get("exp")
+    if exp is not None and (not isinstance(exp, (int, float)) or exp <= time.time()):
+        return None
+    return payload
+
+def create_access_token_sub(subject: str, expires_delta: timedelta) -> str:
+    """Fast path for the common {"sub": ...} token, built without PyJWT"""
+    expire = int(time.time() + expires_delta.total_seconds())
+    payload = '{"sub":%s,"exp":%d}' % (json.dumps(subject), expire)
+    signing_input = f"{_HEADER_B64}.{_b64url(payload.encode())}"
+    return f"{signing_input}.{_b64url(_sign(signing_input))}"
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
+    if data.keys() == {"sub"}:
+        return create_access_token_sub(data["sub"], expires_delta or timedelta(minutes=15))
+
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
+    encoded_jwt = jwt.encode(to_encode, SECRET_KEY_BYTES, algorithm=ALGORITHM)
     return encoded_jwt
 
 def verify_token(token: str) -> Optional[TokenData]:
-    try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
+    return _verify_token(token, _token_key(token))
+
+def _verify_token(token: str, key: str) -> Optional[TokenData]:
+    """verify_token with the token's cache key already computed"""
+    with _tok_cache_lock:
+        cached = _tok_cache.get(key)
+    if cached is not None:
+        exp, token_data = cached
+        if exp is not None and exp <= time.time():
+            with _tok_cache_lock:
+                _tok_cache.pop(key, None)
             return None
-        return TokenData(email=email)
-    except JWTError:
+        return token_data
+
+    payload = _decode_token(token)
+    if payload is None:
         return None
+    email: str = payload.get("sub")
+    if email is None:
+        return None
+    token_data = TokenData(email=email)
+
+    with _tok_cache_lock:
+        _tok_cache[key] = (payload.get("exp"), token_data)
+    return token_data
 
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> User:
     credentials_exception = HTTPException(
@@ -48,25 +174,49 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(s
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    token_data = verify_token(credentials.credentials)
+    # One hash per request, shared by the token and user caches
+    key = _token_key(credentials.credentials)
+    token_data = _verify_token(credentials.credentials, key)
     if token_data is None:
         raise credentials_exception
 
-    from database.repository import db  # Import here to avoid circular imports
-    user = db.get_user_by_email(token_data.email)
+    with _user_cache_lock:
+        user = _user_cache.get(key)
+    if user is not None:
+        return user
+
+    user = await asyncio.to_thread(db.get_user_by_email, token_data.email)
     if user is None:
         raise credentials_exception
 
+    with _user_cache_lock:
+        _user_cache[key] = user
     return user
 
-def authenticate_user(email: str, password: str) -> Optional[User]:
-    from database.repository import db
-    user = db.get_user_by_email(email)
-    if not user:
+def invalidate_cached_user(email: str):
+    """Drop cached users for an email after its row changes"""
+    with _user_cache_lock:
+        stale = [key for key, user in _user_cache.items() if user.email == email]
+        for key in stale:
+            _user_cache.pop(key, None)
+
+async def authenticate_user(email: str, password: str) -> Optional[User]:
+    # bcrypt releases the GIL, so running it in a worker thread keeps the event
+    # loop free and lets concurrent logins use multiple cores
+    user, password_hash = await asyncio.to_thread(db.get_user_with_hash, email)
+    if not password_hash:
+        # Burn the same bcrypt time as a real check so response timing
+        # doesn't reveal whether the email is registered
+        dummy_hash = await asyncio.to_thread(_get_dummy_hash)
+        await asyncio.to_thread(bcrypt.checkpw, password.encode(), dummy_hash)
         return None
-    password_hash = db.get_user_password_hash(email)
-    if not password_hash or not verify_password(password, password_hash):
+    if not await asyncio.to_thread(verify_password, password, password_hash):
         return None
+    if password_needs_rehash(password_hash):
+        # Stored hash predates the current cost setting, rehash transparently
+        new_hash = await asyncio.to_thread(get_password_hash, password)
+        await asyncio.to_thread(db.set_user_password_hash, email, new_hash)
+        invalidate_cached_user(email)
     return user
 
 def create_demo_user() -> User:
@@ -1,5 +1,7 @@
 from datetime import timedelta
+from typing import Optional, Tuple
 from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.orm import Session
 from models import UserCreate, UserLogin, Token, User as UserResponse, CreateAccount
 from database.models import User, Account
 from auth.auth import (
@@ -9,33 +11,47 @@ from auth.auth import (
     ACCESS_TOKEN_EXPIRE_MINUTES,
     get_current_user
 )
+from database.config import get_database
 from database.repository import db
+from metrics import record_accounts_created
 from datetime import datetime
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/auth", tags=["authentication"])
 
+# Demo login always mints a token for the same user, so reuse it for a short
+# window instead of looking up the user and signing a new JWT per request.
+# The window is much shorter than the token lifetime, so a cached token is
+# always handed out with nearly its full validity left.
+DEMO_TOKEN_REFRESH = timedelta(seconds=60)
+_demo_token_cache: Optional[Tuple[str, datetime]] = None
+
 @router.post("/signup", response_model=UserResponse)
-async def signup(user_data: UserCreate):
+async def signup(user_data: UserCreate, session: Session = Depends(get_database)):
     # Check if user already exists
-    if db.get_user_by_email(user_data.email):
+    if await asyncio.to_thread(db.get_user_by_email, user_data.email):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Email already registered"
         )
 
     # Create new user (ID will be auto-generated)
-    hashed_password = get_password_hash(user_data.password)
+    hashed_password = await asyncio.to_thread(get_password_hash, user_data.password)
     new_user = User(
         email=user_data.email,
         name=user_data.name,
         created_at=datetime.now()
     )
 
-    new_user = db.create_user(new_user)  # Get user with generated ID
-    db.set_user_password_hash(user_data.email, hashed_password)
+    # Database writes block, so run them off the event loop
+    return await asyncio.to_thread(create_user_with_accounts, new_user, hashed_password, session)
+
+def create_user_with_accounts(new_user: User, hashed_password: str, session: Session) -> User:
+    """Write the user and their default accounts in one transaction / one commit"""
+    new_user = db.create_user(new_user, hashed_password, session=session)
 
     # Create default accounts for new user
     default_accounts = [
@@ -51,37 +67,24 @@ async def signup(user_data: UserCreate):
         )
     ]
 
-    # Add accounts using repository
-    for account in default_accounts:
-        db.add_account(account)
+    db.add_accounts(default_accounts, session=session)
+    session.commit()
+    record_accounts_created(len(default_accounts), sum(a.balance for a in default_accounts))
 
     return new_user
 
 @router.post("/login", response_model=Token)
 async def login(user_credentials: UserLogin):
-    logger.info(f"Login attempt for email: {user_credentials.email}")
-    
-    # Check if user exists first
-    user_exists = db.get_user_by_email(user_credentials.email)
-    if not user_exists:
-        logger.warning(f"Login failed: User {user_credentials.email} not found")
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Incorrect email or password",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-    
-    logger.info(f"User {user_credentials.email} found, checking password")
-    user = authenticate_user(user_credentials.email, user_credentials.password)
+    user = await authenticate_user(user_credentials.email, user_credentials.password)
     if not user:
-        logger.warning(f"Login failed: Invalid password for {user_credentials.email}")
+        logger.warning("Login failed for %s", user_credentials.email)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
     
-    logger.info(f"Login successful for {user_credentials.email}")
+    logger.info("Login successful for %s", user_credentials.email)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.email}, expires_delta=access_token_expires
@@ -91,9 +94,13 @@ async def login(user_credentials: UserLogin):
 @router.post("/demo-login", response_model=Token)
 async def demo_login():
     """Quick login for demo purposes"""
+    global _demo_token_cache
     logger.info("Demo login attempt")
-    
-    user = db.get_user_by_email("demo@monzo.com")
+
+    if _demo_token_cache and datetime.utcnow() < _demo_token_cache[1]:
+        return {"access_token": _demo_token_cache[0], "token_type": "bearer"}
+
+    user = await asyncio.to_thread(db.get_user_by_email, "demo@monzo.com")
     if not user:
         logger.error("Demo login failed: Demo user not found in database")
         raise HTTPException(
@@ -101,11 +108,12 @@ async def demo_login():
             detail="Demo user not found"
         )
 
-    logger.info(f"Demo login successful for user: {user.email}")
+    logger.info("Demo login successful for user: %s", user.email)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": user.email}, expires_delta=access_token_expires
     )
+    _demo_token_cache = (access_token, datetime.utcnow() + DEMO_TOKEN_REFRESH)
     return {"access_token": access_token, "token_type": "bearer"}
 
 @router.get("/me", response_model=UserResponse)
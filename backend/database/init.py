@@ -22,12 +22,12 @@ def run_migrations():
             check=True
         )
         logger.info("Database migrations completed successfully")
-        logger.debug(f"Migration output: {result.stdout}")
+        logger.debug("Migration output: %s", result.stdout)
     except subprocess.CalledProcessError as e:
-        logger.error(f"Migration failed: {e.stderr}")
+        logger.error("Migration failed: %s", e.stderr)
         raise
     except Exception as e:
-        logger.error(f"Error running migrations: {e}")
+        logger.error("Error running migrations: %s", e)
         raise
 
 def init_database():
@@ -41,5 +41,5 @@ def init_database():
         logger.info("Database initialization completed - run 'python seed_database.py' to add demo data")
             
     except Exception as e:
-        logger.error(f"Error initializing database: {e}")
+        logger.error("Error initializing database: %s", e)
         raise
\ No newline at end of file
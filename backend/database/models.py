@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Float, Boolean, DateTime, ForeignKey, Text, Integer
+from sqlalchemy import Column, String, Float, Boolean, DateTime, ForeignKey, Text, Integer, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.dialects.postgresql import UUID
@@ -22,14 +22,14 @@ class Account(Base):
     __tablename__ = "accounts"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    uuid = Column(UUID(as_uuid=True), default=uuid.uuid4, nullable=False, unique=True)
+    uuid = Column(UUID(as_uuid=False), default=lambda: str(uuid.uuid4()), nullable=False, unique=True)
     name = Column(String, nullable=False)
     balance = Column(Float, nullable=False, default=0.0)
-    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
     
     user = relationship("User", back_populates="accounts")
     transactions = relationship("Transaction", back_populates="account", cascade="all, delete-orphan")
-    topup_rules = relationship("TopUpRule", back_populates="account", cascade="all, delete-orphan")
+    topup_rules = relationship("TopUpRule", back_populates="account", cascade="all, delete-orphan", lazy="raise")
     topup_events = relationship("TopUpEvent", back_populates="account", cascade="all, delete-orphan")
 
 class Transaction(Base):
@@ -46,6 +46,10 @@ class Transaction(Base):
     
     account = relationship("Account", back_populates="transactions")
 
+    __table_args__ = (
+        Index("ix_transactions_account_id_timestamp", account_id, timestamp.desc()),
+    )
+
 class TopUpRule(Base):
     __tablename__ = "topup_rules"
     
@@ -57,6 +61,10 @@ class TopUpRule(Base):
     
     account = relationship("Account", back_populates="topup_rules")
 
+    __table_args__ = (
+        Index("ix_topup_rules_account_id_enabled_threshold", account_id, enabled, threshold),
+    )
+
 class TopUpEvent(Base):
     __tablename__ = "topup_events"
     
@@ -66,4 +74,8 @@ class TopUpEvent(Base):
     triggered_balance = Column(Float, nullable=False)
     timestamp = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     
-    account = relationship("Account", back_populates="topup_events")
\ No newline at end of file
+    account = relationship("Account", back_populates="topup_events")
+
+    __table_args__ = (
+        Index("ix_topup_events_account_id_timestamp", account_id, timestamp.desc()),
+    )
\ No newline at end of file
@@ -1,8 +1,43 @@
-from typing import List, Optional
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Iterator, List, Optional, Tuple
+from sqlalchemy import and_, bindparam, func, insert, lambda_stmt, literal, select, tuple_, update
 from sqlalchemy.orm import Session
 from database.config import get_database
 from database.models import User as DBUser, Account as DBAccount, Transaction as DBTransaction, TopUpRule as DBTopUpRule, TopUpEvent as DBTopUpEvent
-from models import User, Account, CreateAccount, Transaction, CreateTransaction, TopUpRule, TopUpEvent
+from models import User, Account, CreateAccount, Transaction, TopUpRule, TopUpEvent
+
+# Column sets for read-only list queries, fetched as plain rows instead of ORM entities
+_ACCOUNT_COLUMNS = (DBAccount.id, DBAccount.uuid, DBAccount.name, DBAccount.balance, DBAccount.user_id)
+_TRANSACTION_COLUMNS = (
+    DBTransaction.id, DBTransaction.account_id, DBTransaction.amount, DBTransaction.merchant,
+    DBTransaction.description, DBTransaction.category, DBTransaction.transaction_type, DBTransaction.timestamp
+)
+_TOPUP_RULE_COLUMNS = (DBTopUpRule.id, DBTopUpRule.account_id, DBTopUpRule.threshold, DBTopUpRule.topup_amount, DBTopUpRule.enabled)
+_TOPUP_EVENT_COLUMNS = (DBTopUpEvent.id, DBTopUpEvent.account_id, DBTopUpEvent.amount, DBTopUpEvent.triggered_balance, DBTopUpEvent.timestamp)
+
+def _keyset_page(stmt, model, before_ts: Optional[datetime], before_id: Optional[int]):
+    """Keyset cursor for newest-first pages; the id breaks ties between equal timestamps"""
+    if before_ts is not None:
+        if before_id is not None:
+            stmt = stmt.where(tuple_(model.timestamp, model.id) < tuple_(before_ts, before_id))
+        else:
+            stmt = stmt.where(model.timestamp < before_ts)
+    return stmt.order_by(model.timestamp.desc(), model.id.desc())
+
+# Cached statements for the hot single-row lookups; SQL is compiled once and reused
+_USER_BY_EMAIL = lambda_stmt(lambda: select(DBUser).where(DBUser.email == bindparam("email")))
+_USER_BY_ID = lambda_stmt(lambda: select(DBUser).where(DBUser.id == bindparam("id")))
+_ACCOUNT_BY_UUID = lambda_stmt(lambda: select(DBAccount).where(DBAccount.uuid == bindparam("uuid")))
+_ACCOUNT_BY_UUID_AND_USER = lambda_stmt(lambda: select(DBAccount).where(
+    DBAccount.uuid == bindparam("uuid"),
+    DBAccount.user_id == bindparam("user_id")
+))
+_ACCOUNT_BY_ID_AND_USER = lambda_stmt(lambda: select(DBAccount).where(
+    DBAccount.id == bindparam("id"),
+    DBAccount.user_id == bindparam("user_id")
+))
+_ACCOUNTS_BY_USER = lambda_stmt(lambda: select(*_ACCOUNT_COLUMNS).where(DBAccount.user_id == bindparam("user_id")))
 
 class SQLiteRepository:
     def __init__(self):
@@ -12,11 +47,26 @@ class SQLiteRepository:
         """Get database session"""
         return next(get_database())
 
-    # User methods
-    def get_user_by_email(self, email: str) -> Optional[User]:
+    @contextmanager
+    def _session(self, session: Optional[Session] = None) -> Iterator[Session]:
+        """Use the caller's session (caller commits), or a private one committed on exit"""
+        if session is not None:
+            yield session
+            return
         db = self._get_db()
         try:
-            db_user = db.query(DBUser).filter(DBUser.email == email).first()
+            yield db
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    # User methods
+    def get_user_by_email(self, email: str, session: Optional[Session] = None) -> Optional[User]:
+        with self._session(session) as db:
+            db_user = db.execute(_USER_BY_EMAIL, {"email": email}).scalar_one_or_none()
             if db_user:
                 return User(
                     id=db_user.id,
@@ -25,13 +75,10 @@ class SQLiteRepository:
                     created_at=db_user.created_at
                 )
             return None
-        finally:
-            db.close()
 
-    def get_user_by_id(self, user_id: str) -> Optional[User]:
-        db = self._get_db()
-        try:
-            db_user = db.query(DBUser).filter(DBUser.id == user_id).first()
+    def get_user_by_id(self, user_id: str, session: Optional[Session] = None) -> Optional[User]:
+        with self._session(session) as db:
+            db_user = db.execute(_USER_BY_ID, {"id": user_id}).scalar_one_or_none()
             if db_user:
                 return User(
                     id=db_user.id,
@@ -40,315 +87,296 @@ class SQLiteRepository:
                     created_at=db_user.created_at
                 )
             return None
-        finally:
-            db.close()
-
-    def create_user(self, user: User) -> User:
-        db = self._get_db()
-        try:
-            db_user = DBUser(
-                email=user.email,
-                name=user.name,
-                password_hash="",  # Will be set separately
-                created_at=user.created_at
-            )
-            db.add(db_user)
-            db.commit()
-            db.refresh(db_user)  # Get the auto-generated ID
 
+    def create_user(self, user: User, password_hash: str = "", session: Optional[Session] = None) -> User:
+        with self._session(session) as db:
             # Return user with the generated ID
-            user.id = db_user.id
+            user.id = db.execute(
+                insert(DBUser)
+                .values(
+                    email=user.email,
+                    name=user.name,
+                    password_hash=password_hash,
+                    created_at=user.created_at
+                )
+                .returning(DBUser.id)
+            ).scalar_one()
             return user
-        finally:
-            db.close()
 
-    def get_user_password_hash(self, email: str) -> Optional[str]:
-        db = self._get_db()
-        try:
-            db_user = db.query(DBUser).filter(DBUser.email == email).first()
-            return db_user.password_hash if db_user else None
-        finally:
-            db.close()
+    def get_user_with_hash(self, email: str, session: Optional[Session] = None) -> Tuple[Optional[User], Optional[str]]:
+        """Get a user and their password hash in a single query"""
+        with self._session(session) as db:
+            db_user = db.execute(_USER_BY_EMAIL, {"email": email}).scalar_one_or_none()
+            if db_user:
+                user = User(
+                    id=db_user.id,
+                    email=db_user.email,
+                    name=db_user.name,
+                    created_at=db_user.created_at
+                )
+                return user, db_user.password_hash
+            return None, None
 
-    def set_user_password_hash(self, email: str, password_hash: str):
-        db = self._get_db()
-        try:
-            db_user = db.query(DBUser).filter(DBUser.email == email).first()
+    def set_user_password_hash(self, email: str, password_hash: str, session: Optional[Session] = None):
+        with self._session(session) as db:
+            db_user = db.execute(_USER_BY_EMAIL, {"email": email}).scalar_one_or_none()
             if db_user:
                 db_user.password_hash = password_hash
-                db.commit()
-        finally:
-            db.close()
+                db.flush()
 
     # Account methods
-    def get_accounts(self) -> List[Account]:
-        db = self._get_db()
-        try:
-            db_accounts = db.query(DBAccount).all()
-            return [Account(
-                id=acc.id,
-                uuid=str(acc.uuid),
-                name=acc.name,
-                balance=acc.balance,
-                user_id=acc.user_id
-            ) for acc in db_accounts]
-        finally:
-            db.close()
+    def get_accounts_summary(self, session: Optional[Session] = None) -> Tuple[int, float]:
+        """Get the number of accounts and their total balance in one aggregate query"""
+        with self._session(session) as db:
+            count, total = db.execute(
+                select(func.count(DBAccount.id), func.coalesce(func.sum(DBAccount.balance), 0.0))
+            ).one()
+            return count, total
 
-    def get_accounts_by_user(self, user_id: str) -> List[Account]:
-        db = self._get_db()
-        try:
-            db_accounts = db.query(DBAccount).filter(DBAccount.user_id == user_id).all()
-            return [Account(
-                id=acc.id,
-                uuid=str(acc.uuid),
-                name=acc.name,
-                balance=acc.balance,
-                user_id=acc.user_id
-            ) for acc in db_accounts]
-        finally:
-            db.close()
+    def get_accounts_by_user(self, user_id: str, session: Optional[Session] = None) -> List[Account]:
+        with self._session(session) as db:
+            rows = db.execute(_ACCOUNTS_BY_USER, {"user_id": user_id})
+            return [Account.model_construct(**row) for row in rows.mappings()]
 
-    def get_account(self, account_id: str) -> Optional[Account]:
-        db = self._get_db()
-        try:
-            db_account = db.query(DBAccount).filter(DBAccount.id == account_id).first()
+    def get_account_by_uuid(self, account_uuid: str, session: Optional[Session] = None) -> Optional[Account]:
+        with self._session(session) as db:
+            db_account = db.execute(_ACCOUNT_BY_UUID, {"uuid": account_uuid}).scalar_one_or_none()
             if db_account:
                 return Account(
                     id=db_account.id,
-                    uuid=str(db_account.uuid),
+                    uuid=db_account.uuid,
                     name=db_account.name,
                     balance=db_account.balance,
                     user_id=db_account.user_id
                 )
             return None
-        finally:
-            db.close()
 
-    def get_account_by_uuid(self, account_uuid: str) -> Optional[Account]:
-        db = self._get_db()
-        try:
-            db_account = db.query(DBAccount).filter(DBAccount.uuid == account_uuid).first()
+    def get_account_by_uuid_and_user(self, account_uuid: str, user_id: str, session: Optional[Session] = None) -> Optional[Account]:
+        with self._session(session) as db:
+            db_account = db.execute(
+                _ACCOUNT_BY_UUID_AND_USER, {"uuid": account_uuid, "user_id": user_id}
+            ).scalar_one_or_none()
             if db_account:
                 return Account(
                     id=db_account.id,
-                    uuid=str(db_account.uuid),
+                    uuid=db_account.uuid,
                     name=db_account.name,
                     balance=db_account.balance,
                     user_id=db_account.user_id
                 )
             return None
-        finally:
-            db.close()
 
-    def get_account_by_uuid_and_user(self, account_uuid: str, user_id: str) -> Optional[Account]:
-        db = self._get_db()
-        try:
-            db_account = db.query(DBAccount).filter(
-                DBAccount.uuid == account_uuid,
-                DBAccount.user_id == user_id
-            ).first()
+    def get_account_by_user(self, account_id: str, user_id: str, session: Optional[Session] = None) -> Optional[Account]:
+        with self._session(session) as db:
+            db_account = db.execute(
+                _ACCOUNT_BY_ID_AND_USER, {"id": account_id, "user_id": user_id}
+            ).scalar_one_or_none()
             if db_account:
                 return Account(
                     id=db_account.id,
-                    uuid=str(db_account.uuid),
+                    uuid=db_account.uuid,
                     name=db_account.name,
                     balance=db_account.balance,
                     user_id=db_account.user_id
                 )
             return None
-        finally:
-            db.close()
 
-    def get_account_by_user(self, account_id: str, user_id: str) -> Optional[Account]:
-        db = self._get_db()
-        try:
-            db_account = db.query(DBAccount).filter(
-                DBAccount.id == account_id,
-                DBAccount.user_id == user_id
-            ).first()
-            if db_account:
-                return Account(
-                    id=db_account.id,
-                    uuid=str(db_account.uuid),
-                    name=db_account.name,
-                    balance=db_account.balance,
-                    user_id=db_account.user_id
-                )
-            return None
-        finally:
-            db.close()
+    def add_accounts(self, accounts: List[CreateAccount], session: Optional[Session] = None) -> List[Account]:
+        with self._session(session) as db:
+            rows = db.execute(
+                insert(DBAccount).returning(*_ACCOUNT_COLUMNS, sort_by_parameter_order=True),
+                [{
+                    "name": account.name,
+                    "balance": account.balance,
+                    "user_id": account.user_id
+                } for account in accounts]
+            ).mappings()
+            return [Account.model_construct(**row) for row in rows]
 
-    def add_account(self, account: CreateAccount) -> Account:
-        db = self._get_db()
-        try:
-            db_account = DBAccount(
-                name=account.name,
-                balance=account.balance,
-                user_id=account.user_id
-            )
-            db.add(db_account)
-            db.commit()
-            db.refresh(db_account)  # Get the auto-generated ID
-
-            # Return account with the generated ID and UUID
-            return Account(
-                id=db_account.id,
-                uuid=str(db_account.uuid),
-                name=account.name,
-                balance=account.balance,
-                user_id=account.user_id
-            )
-        finally:
-            db.close()
+    def apply_balance_delta(self, account_id: str, delta: float, session: Optional[Session] = None) -> Optional[float]:
+        """Atomically add delta to an account balance in one UPDATE, returning the new balance"""
+        with self._session(session) as db:
+            return db.execute(
+                update(DBAccount)
+                .where(DBAccount.id == account_id)
+                .values(balance=DBAccount.balance + delta)
+                .returning(DBAccount.balance)
+            ).scalar_one_or_none()
 
-    def update_account_balance(self, account_id: str, new_balance: float):
-        db = self._get_db()
-        try:
-            db_account = db.query(DBAccount).filter(DBAccount.id == account_id).first()
-            if db_account:
-                db_account.balance = new_balance
-                db.commit()
-        finally:
-            db.close()
+    def debit_or_credit(self, account_id: str, user_id: str, delta: float, session: Optional[Session] = None) -> Optional[float]:
+        """Apply delta to an account the user owns, returning the new balance (None if not theirs)"""
+        with self._session(session) as db:
+            return db.execute(
+                update(DBAccount)
+                .where(DBAccount.id == account_id, DBAccount.user_id == user_id)
+                .values(balance=DBAccount.balance + delta)
+                .returning(DBAccount.balance)
+            ).scalar_one_or_none()
 
     # Transaction methods
-    def get_transactions(self, account_id: Optional[str] = None) -> List[Transaction]:
-        db = self._get_db()
-        try:
-            query = db.query(DBTransaction)
+    def get_transactions_for_user(self, user_id: str, account_id: Optional[str] = None, limit: Optional[int] = None,
+                                  before_ts: Optional[datetime] = None, before_id: Optional[int] = None,
+                                  session: Optional[Session] = None) -> List[Transaction]:
+        """Get a user's transactions newest first, scoped by a join on accounts.user_id"""
+        with self._session(session) as db:
+            stmt = (
+                select(*_TRANSACTION_COLUMNS)
+                .join(DBAccount, DBAccount.id == DBTransaction.account_id)
+                .where(DBAccount.user_id == user_id)
+            )
             if account_id:
-                query = query.filter(DBTransaction.account_id == account_id)
-
-            db_transactions = query.order_by(DBTransaction.timestamp.desc()).all()
-            return [Transaction(
-                id=txn.id,
-                account_id=txn.account_id,
-                amount=txn.amount,
-                merchant=txn.merchant,
-                description=txn.description,
-                category=txn.category,
-                transaction_type=txn.transaction_type,
-                timestamp=txn.timestamp
-            ) for txn in db_transactions]
-        finally:
-            db.close()
+                stmt = stmt.where(DBTransaction.account_id == account_id)
+            stmt = _keyset_page(stmt, DBTransaction, before_ts, before_id)
+            if limit is not None:
+                stmt = stmt.limit(limit)
+            return [Transaction.model_construct(**row) for row in db.execute(stmt).mappings()]
 
-    def get_all_transactions(self) -> List[Transaction]:
-        """Get ALL transactions from the database - for observability/metrics purposes"""
-        db = self._get_db()
-        try:
-            db_transactions = db.query(DBTransaction).order_by(DBTransaction.timestamp.desc()).all()
-            return [Transaction(
-                id=txn.id,
-                account_id=txn.account_id,
-                amount=txn.amount,
-                merchant=txn.merchant,
-                description=txn.description,
-                category=txn.category,
-                transaction_type=txn.transaction_type,
-                timestamp=txn.timestamp
-            ) for txn in db_transactions]
-        finally:
-            db.close()
+    def get_transaction_counts(self, session: Optional[Session] = None) -> List[Tuple[str, str, int]]:
+        """Count transactions per (transaction_type, category), with uncategorized ones under Other"""
+        with self._session(session) as db:
+            category = func.coalesce(DBTransaction.category, "Other")
+            return db.execute(
+                select(DBTransaction.transaction_type, category, func.count())
+                .group_by(DBTransaction.transaction_type, category)
+            ).all()
 
-    def add_transaction(self, transaction: Transaction) -> Transaction:
-        db = self._get_db()
-        try:
-            db_transaction = DBTransaction(
-                account_id=transaction.account_id,
-                amount=transaction.amount,
-                merchant=transaction.merchant,
-                description=transaction.description,
-                category=transaction.category,
-                transaction_type=transaction.transaction_type,
-                timestamp=transaction.timestamp
-            )
-            db.add(db_transaction)
-            db.commit()
-            db.refresh(db_transaction)  # Get the auto-generated ID
+    def count_topup_events(self, session: Optional[Session] = None) -> int:
+        with self._session(session) as db:
+            return db.execute(select(func.count(DBTopUpEvent.id))).scalar_one()
 
+    def add_transaction(self, transaction: Transaction, session: Optional[Session] = None) -> Transaction:
+        with self._session(session) as db:
             # Return transaction with the generated ID
-            transaction.id = db_transaction.id
+            transaction.id = db.execute(
+                insert(DBTransaction)
+                .values(
+                    account_id=transaction.account_id,
+                    amount=transaction.amount,
+                    merchant=transaction.merchant,
+                    description=transaction.description,
+                    category=transaction.category,
+                    transaction_type=transaction.transaction_type,
+                    timestamp=transaction.timestamp
+                )
+                .returning(DBTransaction.id)
+            ).scalar_one()
             return transaction
-        finally:
-            db.close()
 
     # TopUp Rules methods
-    def get_topup_rules(self, account_id: Optional[str] = None) -> List[TopUpRule]:
-        db = self._get_db()
-        try:
-            query = db.query(DBTopUpRule)
+    def get_topup_rules_for_user(self, user_id: str, account_id: Optional[str] = None, session: Optional[Session] = None) -> List[TopUpRule]:
+        """Get a user's topup rules, scoped by a join on accounts.user_id"""
+        with self._session(session) as db:
+            stmt = (
+                select(*_TOPUP_RULE_COLUMNS)
+                .join(DBAccount, DBAccount.id == DBTopUpRule.account_id)
+                .where(DBAccount.user_id == user_id)
+            )
             if account_id:
-                query = query.filter(DBTopUpRule.account_id == account_id)
-
-            db_rules = query.all()
-            return [TopUpRule(
-                id=rule.id,
-                account_id=rule.account_id,
-                threshold=rule.threshold,
-                topup_amount=rule.topup_amount,
-                enabled=rule.enabled
-            ) for rule in db_rules]
-        finally:
-            db.close()
+                stmt = stmt.where(DBTopUpRule.account_id == account_id)
 
-    def add_topup_rule(self, rule: TopUpRule) -> TopUpRule:
-        db = self._get_db()
-        try:
-            db_rule = DBTopUpRule(
-                account_id=rule.account_id,
-                threshold=rule.threshold,
-                topup_amount=rule.topup_amount,
-                enabled=rule.enabled
+            return [TopUpRule.model_construct(**row) for row in db.execute(stmt).mappings()]
+
+    def get_max_topup_threshold(self, account_id: str, session: Optional[Session] = None) -> Optional[float]:
+        """Highest threshold among an account's enabled rules, or None if it has none"""
+        with self._session(session) as db:
+            return db.execute(
+                select(func.max(DBTopUpRule.threshold))
+                .where(DBTopUpRule.account_id == account_id, DBTopUpRule.enabled == True)
+            ).scalar()
+
+    def get_account_with_triggered_rule(self, account_id: str, session: Optional[Session] = None) -> Tuple[Optional[Account], Optional[TopUpRule]]:
+        """Get an account and its highest-threshold triggered rule in one query.
+
+        The account row is locked (FOR UPDATE) until the caller commits, so concurrent
+        checks can't both see the same low balance and top up twice. The lock only
+        applies on PostgreSQL: SQLite has no row locks and drops FOR UPDATE, so there
+        the race is left to its single-writer lock and isn't exercised by the tests.
+        """
+        with self._session(session) as db:
+            row = db.execute(
+                select(
+                    *_ACCOUNT_COLUMNS,
+                    DBTopUpRule.id.label("rule_id"),
+                    DBTopUpRule.threshold,
+                    DBTopUpRule.topup_amount,
+                    DBTopUpRule.enabled
+                )
+                .outerjoin(DBTopUpRule, and_(
+                    DBTopUpRule.account_id == DBAccount.id,
+                    DBTopUpRule.enabled == True,
+                    DBTopUpRule.threshold > DBAccount.balance
+                ))
+                .where(DBAccount.id == account_id)
+                .order_by(DBTopUpRule.threshold.desc().nulls_last())
+                .limit(1)
+                .with_for_update(of=DBAccount)
+            ).first()
+            if not row:
+                return None, None
+            account = Account(id=row.id, uuid=row.uuid, name=row.name, balance=row.balance, user_id=row.user_id)
+            if row.rule_id is None:
+                return account, None
+            return account, TopUpRule(
+                id=row.rule_id,
+                account_id=row.id,
+                threshold=row.threshold,
+                topup_amount=row.topup_amount,
+                enabled=row.enabled
             )
-            db.add(db_rule)
-            db.commit()
-            db.refresh(db_rule)  # Get the auto-generated ID
+
+    def add_topup_rule_for_user(self, rule: TopUpRule, user_id: str, session: Optional[Session] = None) -> Optional[TopUpRule]:
+        """Insert a rule only if the account belongs to user_id, in one INSERT ... SELECT; None if it doesn't"""
+        with self._session(session) as db:
+            owned_account = select(
+                DBAccount.id,
+                literal(rule.threshold),
+                literal(rule.topup_amount),
+                literal(rule.enabled)
+            ).where(DBAccount.id == rule.account_id, DBAccount.user_id == user_id)
+            rule_id = db.execute(
+                insert(DBTopUpRule)
+                .from_select(["account_id", "threshold", "topup_amount", "enabled"], owned_account)
+                .returning(DBTopUpRule.id)
+            ).scalar_one_or_none()
+            if rule_id is None:
+                return None
 
             # Return rule with the generated ID
-            rule.id = db_rule.id
+            rule.id = rule_id
             return rule
-        finally:
-            db.close()
 
     # TopUp Events methods
-    def get_topup_events(self, account_id: Optional[str] = None) -> List[TopUpEvent]:
-        db = self._get_db()
-        try:
-            query = db.query(DBTopUpEvent)
-            if account_id:
-                query = query.filter(DBTopUpEvent.account_id == account_id)
-
-            db_events = query.order_by(DBTopUpEvent.timestamp.desc()).all()
-            return [TopUpEvent(
-                id=event.id,
-                account_id=event.account_id,
-                amount=event.amount,
-                triggered_balance=event.triggered_balance,
-                timestamp=event.timestamp
-            ) for event in db_events]
-        finally:
-            db.close()
-
-    def add_topup_event(self, event: TopUpEvent) -> TopUpEvent:
-        db = self._get_db()
-        try:
-            db_event = DBTopUpEvent(
-                account_id=event.account_id,
-                amount=event.amount,
-                triggered_balance=event.triggered_balance,
-                timestamp=event.timestamp
+    def get_topup_events_for_user(self, user_id: str, account_id: Optional[str] = None, limit: Optional[int] = None,
+                                  before_ts: Optional[datetime] = None, before_id: Optional[int] = None,
+                                  session: Optional[Session] = None) -> List[TopUpEvent]:
+        """Get a user's topup events newest first, scoped by a join on accounts.user_id"""
+        with self._session(session) as db:
+            stmt = (
+                select(*_TOPUP_EVENT_COLUMNS)
+                .join(DBAccount, DBAccount.id == DBTopUpEvent.account_id)
+                .where(DBAccount.user_id == user_id)
             )
-            db.add(db_event)
-            db.commit()
-            db.refresh(db_event)  # Get the auto-generated ID
+            if account_id:
+                stmt = stmt.where(DBTopUpEvent.account_id == account_id)
+            stmt = _keyset_page(stmt, DBTopUpEvent, before_ts, before_id)
+            if limit is not None:
+                stmt = stmt.limit(limit)
+            return [TopUpEvent.model_construct(**row) for row in db.execute(stmt).mappings()]
 
+    def add_topup_event(self, event: TopUpEvent, session: Optional[Session] = None) -> TopUpEvent:
+        with self._session(session) as db:
             # Return event with the generated ID
-            event.id = db_event.id
+            event.id = db.execute(
+                insert(DBTopUpEvent)
+                .values(
+                    account_id=event.account_id,
+                    amount=event.amount,
+                    triggered_balance=event.triggered_balance,
+                    timestamp=event.timestamp
+                )
+                .returning(DBTopUpEvent.id)
+            ).scalar_one()
             return event
-        finally:
-            db.close()
 
 # Create singleton instance
 db = SQLiteRepository()
@@ -1,43 +1,30 @@
 import logging
-import json
 import sys
-from datetime import datetime
+import orjson
 from typing import Dict, Any
 
+# Record attributes passed via `extra=` that are copied into the JSON entry
+_EXTRA_KEYS = frozenset({
+    "user_id", "account_id", "transaction_id", "endpoint", "method",
+    "status_code", "duration_ms", "error_type", "category", "amount"
+})
+
 class JSONFormatter(logging.Formatter):
     """Custom JSON formatter for structured logging"""
+
+    _STATIC_FIELDS = {"service": "monzo-api", "version": "1.0.0"}
     
     def format(self, record: logging.LogRecord) -> str:
         log_entry = {
-            "timestamp": datetime.utcnow().isoformat() + "Z",
+            "timestamp": record.created,  # Unix epoch seconds
             "level": record.levelname,
             "logger": record.name,
             "message": record.getMessage(),
-            "service": "monzo-api",
-            "version": "1.0.0"
+            **self._STATIC_FIELDS
         }
         
         # Add extra fields if present
-        if hasattr(record, 'user_id'):
-            log_entry["user_id"] = record.user_id
-        if hasattr(record, 'account_id'):
-            log_entry["account_id"] = record.account_id
-        if hasattr(record, 'transaction_id'):
-            log_entry["transaction_id"] = record.transaction_id
-        if hasattr(record, 'endpoint'):
-            log_entry["endpoint"] = record.endpoint
-        if hasattr(record, 'method'):
-            log_entry["method"] = record.method
-        if hasattr(record, 'status_code'):
-            log_entry["status_code"] = record.status_code
-        if hasattr(record, 'duration_ms'):
-            log_entry["duration_ms"] = record.duration_ms
-        if hasattr(record, 'error_type'):
-            log_entry["error_type"] = record.error_type
-        if hasattr(record, 'category'):
-            log_entry["category"] = record.category
-        if hasattr(record, 'amount'):
-            log_entry["amount"] = record.amount
+        log_entry.update({k: v for k, v in record.__dict__.items() if k in _EXTRA_KEYS})
         
         # Add exception info if present
         if record.exc_info:
@@ -47,7 +34,7 @@ class JSONFormatter(logging.Formatter):
         if record.levelno >= logging.ERROR and record.stack_info:
             log_entry["stack_trace"] = record.stack_info
             
-        return json.dumps(log_entry)
+        return orjson.dumps(log_entry, default=str).decode()
 
 def setup_logging():
     """Set up structured logging configuration"""
@@ -91,8 +78,10 @@ def get_logger(name: str) -> logging.Logger:
 # Convenience functions for structured logging
 def log_transaction_created(logger: logging.Logger, user_id: str, account_id: str, 
                           transaction_id: str, amount: float, category: str, merchant: str):
-    """Log transaction creation event"""
-    logger.info(
+    """Log transaction creation event (DEBUG: carries transaction contents)"""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
+    logger.debug(
         "Transaction created successfully",
         extra={
             "user_id": user_id,
@@ -108,6 +97,8 @@ def log_transaction_created(logger: logging.Logger, user_id: str, account_id: st
 def log_topup_triggered(logger: logging.Logger, user_id: str, account_id: str, 
                        amount: float, triggered_balance: float, rule_id: str):
     """Log topup trigger event"""
+    if not logger.isEnabledFor(logging.INFO):
+        return
     logger.info(
         "TopUp triggered successfully",
         extra={
@@ -123,7 +114,9 @@ def log_topup_triggered(logger: logging.Logger, user_id: str, account_id: str,
 def log_categorizer_request(logger: logging.Logger, merchant: str, amount: float, 
                           category: str, duration_ms: float, success: bool):
     """Log categorizer service request"""
-    level = logging.INFO if success else logging.WARNING
+    level = logging.DEBUG if success else logging.WARNING
+    if not logger.isEnabledFor(level):
+        return
     message = "Categorizer request completed" if success else "Categorizer request failed"
     
     logger.log(
@@ -143,6 +136,8 @@ def log_auth_attempt(logger: logging.Logger, auth_type: str, email: str,
                     success: bool, error_type: str = None):
     """Log authentication attempt"""
     level = logging.INFO if success else logging.WARNING
+    if not logger.isEnabledFor(level):
+        return
     message = f"{auth_type} attempt {'successful' if success else 'failed'}"
     
     extra_data = {
@@ -160,7 +155,15 @@ def log_auth_attempt(logger: logging.Logger, auth_type: str, email: str,
 def log_api_request(logger: logging.Logger, method: str, endpoint: str, 
                    status_code: int, duration_ms: float, user_id: str = None):
     """Log API request"""
-    level = logging.INFO if status_code < 400 else logging.WARNING
+    # Successful requests are routine; DEBUG keeps them off the INFO hot path
+    if status_code < 300:
+        level = logging.DEBUG
+    elif status_code < 400:
+        level = logging.INFO
+    else:
+        level = logging.WARNING
+    if not logger.isEnabledFor(level):
+        return
     
     extra_data = {
         "method": method,
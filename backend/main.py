@@ -1,31 +1,38 @@
-from fastapi import FastAPI, HTTPException, Request, Depends, Response
+from fastapi import FastAPI, HTTPException, Request, Depends, Response, BackgroundTasks, Query
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from models import (
     CreateTransaction, Transaction as TransactionResponse,
     CreateTopUpRule, TopUpRule as TopUpRuleResponse,
     TopUpEvent as TopUpEventResponse,
     Account as AccountResponse,
-    User as UserResponse,
-    CategorizationRequest, CategorizationResponse,
     TransactionType
 )
-from database.models import User, Account, Transaction, TopUpRule, TopUpEvent
+from database.models import User, Transaction, TopUpRule, TopUpEvent
 from database.repository import db
+from database.config import get_database, SessionLocal
 from database.init import init_database
 from auth.routes import router as auth_router
 from auth.auth import get_current_user
+from sqlalchemy.orm import Session
+from pydantic import TypeAdapter
+from cachetools import TTLCache
+import asyncio
 import httpx
-from datetime import datetime
-from typing import List
-import logging
+import orjson
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+import threading
 import time
 
 # Import monitoring modules
 from metrics import (
-    get_metrics, record_transaction, record_topup, record_api_request,
-    record_categorizer_request, record_categorizer_failure, track_request_duration,
-    track_categorizer_duration, update_accounts_count, update_total_balance
+    get_metrics, CONTENT_TYPE_LATEST, record_transaction, record_topup, record_api_request,
+    record_categorizer_request, record_categorizer_failure, record_categorizer_cache_hit,
+    record_categorizer_latency, record_balance_change,
+    record_api_duration, update_accounts_count, update_total_balance
 )
+from observability_service import observability
 from logging_config import (
     setup_logging, get_logger, log_transaction_created, log_topup_triggered,
     log_categorizer_request, log_api_request
@@ -35,7 +42,11 @@ from logging_config import (
 setup_logging()
 logger = get_logger("api")
 
-app = FastAPI(title="Monzo Demo API", version="1.0.0")
+app = FastAPI(
+    title="Monzo Demo API",
+    version="1.0.0",
+    default_response_class=ORJSONResponse  # orjson encodes datetimes natively, in C
+)
 
 @app.on_event("startup")
 async def startup_event():
@@ -44,6 +55,40 @@ async def startup_event():
     # Seed Prometheus metrics from existing database data
     from metrics import seed_metrics_from_database
     seed_metrics_from_database()
+    # One pooled client for the categorizer so connections are reused across requests
+    app.state.categorizer = httpx.AsyncClient(
+        base_url=CATEGORIZER_URL,
+        timeout=5.0,
+        # Idle connections outlive the metrics refill interval, so quiet periods don't
+        # mean a fresh connect on every dashboard refresh
+        limits=httpx.Limits(max_keepalive_connections=100, max_connections=200, keepalive_expiry=60)
+    )
+    observability.client = app.state.categorizer
+    app.state.gauge_resync = asyncio.create_task(resync_account_gauges())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop background work and close the shared categorizer client"""
+    app.state.gauge_resync.cancel()
+    await app.state.categorizer.aclose()
+
+# How often the incrementally maintained account gauges are checked against the database
+GAUGE_RESYNC_INTERVAL = 60  # seconds
+
+async def resync_account_gauges():
+    """Periodically reset the account gauges from the database.
+
+    They are kept current incrementally, but writes that bypass the API (migrations,
+    seeding, manual SQL) would otherwise leave them drifting until restart.
+    """
+    while True:
+        await asyncio.sleep(GAUGE_RESYNC_INTERVAL)
+        try:
+            accounts_count, total_balance = await asyncio.to_thread(db.get_accounts_summary)
+            update_accounts_count(accounts_count)
+            update_total_balance(total_balance)
+        except Exception:
+            logger.exception("Account gauge resync failed")
 
 app.add_middleware(
     CORSMiddleware,
@@ -53,27 +98,26 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Handlers that only do blocking database work are plain `def`, so FastAPI runs
+# them in its threadpool instead of stalling the event loop.
+
 # Prometheus metrics endpoint
 @app.get("/metrics")
-async def metrics():
+def metrics():
     """Prometheus metrics endpoint"""
-    # Update system-wide metrics before serving
-    accounts = db.get_accounts()
-    update_accounts_count(len(accounts))
-    total_balance = sum(acc.balance for acc in accounts)
-    update_total_balance(total_balance)
-
-    return Response(content=get_metrics(), media_type="text/plain")
+    # Account gauges are maintained incrementally, so there is nothing to query here
+    return Response(content=get_metrics(), media_type=CONTENT_TYPE_LATEST)
 
 # JSON metrics endpoint for frontend
+# The observability payloads are plain dicts of JSON types, so they are returned as
+# ready-made responses to skip FastAPI's jsonable_encoder walk over every nested field.
 @app.get("/api/metrics")
 async def api_metrics():
     """JSON metrics endpoint for frontend dashboard"""
     try:
-        from observability_service import observability
-        return await observability.get_metrics()
+        return ORJSONResponse(await observability.get_metrics())
     except Exception as e:
-        logger.error(f"Failed to get metrics: {str(e)}")
+        logger.error("Failed to get metrics: %s", e)
         return {"error": "Failed to retrieve metrics"}
 
 # Categories breakdown endpoint
@@ -81,10 +125,9 @@ async def api_metrics():
 async def get_categories_breakdown():
     """Get transaction category breakdown from Prometheus metrics"""
     try:
-        from observability_service import observability
-        return await observability.get_category_breakdown()
+        return ORJSONResponse(await observability.get_category_breakdown())
     except Exception as e:
-        logger.error(f"Failed to get category breakdown: {str(e)}")
+        logger.error("Failed to get category breakdown: %s", e)
         return {"error": "Failed to retrieve category data"}
 
 # Time series endpoint
@@ -92,51 +135,54 @@ async def get_categories_breakdown():
 async def get_timeseries_data():
     """Get time series data from Prometheus metrics"""
     try:
-        from observability_service import observability
-        return await observability.get_timeseries_data()
+        return ORJSONResponse(await observability.get_timeseries_data())
     except Exception as e:
-        logger.error(f"Failed to get timeseries data: {str(e)}")
+        logger.error("Failed to get timeseries data: %s", e)
         return {"error": "Failed to retrieve timeseries data"}
 
 
 
 # Request tracking middleware
+UNTRACKED_PATHS = frozenset({
+    "/metrics", "/api/metrics", "/api/metrics/categories", "/api/metrics/timeseries",
+    "/health", "/docs", "/redoc", "/openapi.json"
+})
+
 @app.middleware("http")
 async def track_requests(request: Request, call_next):
-    start_time = time.time()
+    path = request.url.path
 
-    # Skip metrics endpoint from tracking to avoid recursion
-    if request.url.path == "/metrics":
+    # Skip metrics/health/docs endpoints from tracking to avoid recursion and scrape noise
+    if path in UNTRACKED_PATHS:
         return await call_next(request)
 
+    start_time = time.perf_counter()
     response = await call_next(request)
 
-    duration = time.time() - start_time
+    duration = time.perf_counter() - start_time
     duration_ms = duration * 1000
 
+    # Label by route template (/accounts/{account_id}) so each id doesn't become its own series
+    route = request.scope.get("route")
+    endpoint = route.path if route else "unmatched"
+
     # Record metrics including duration
     record_api_request(
         method=request.method,
-        endpoint=request.url.path,
+        endpoint=endpoint,
         status_code=response.status_code
     )
 
     # Record the duration we already calculated
-    from metrics import api_request_duration_seconds
-    api_request_duration_seconds.labels(
-        method=request.method,
-        endpoint=request.url.path
-    ).observe(duration)
+    record_api_duration(request.method, endpoint, duration)
 
     # Log request
-    user_id = getattr(request.state, 'user_id', None)
     log_api_request(
         logger=logger,
         method=request.method,
-        endpoint=request.url.path,
+        endpoint=path,
         status_code=response.status_code,
-        duration_ms=duration_ms,
-        user_id=user_id
+        duration_ms=duration_ms
     )
 
     return response
@@ -146,83 +192,183 @@ app.include_router(auth_router)
 
 CATEGORIZER_URL = "http://categorizer:9000"
 
+# Categorizer results keyed on (merchant, type, amount > 700, description), the inputs its
+# rules actually read; repeats skip the HTTP hop
+_category_cache: TTLCache = TTLCache(maxsize=10000, ttl=600)
+# Keys whose lookup just failed; skip the HTTP call (and its timeout) for a short while
+_category_failures: TTLCache = TTLCache(maxsize=10000, ttl=30)
+# Lookups currently on the wire; concurrent misses for the same key await the same future
+_category_inflight: Dict[Tuple, asyncio.Future] = {}
+
+_JSON_HEADERS = {"content-type": "application/json"}
+
+def _category_cache_key(transaction_data: CreateTransaction) -> Tuple:
+    return (
+        transaction_data.merchant.lower(),
+        transaction_data.transaction_type,
+        # The categorizer's only amount rule is "> 700" (rent/mortgage, salary/wages)
+        transaction_data.amount > 700,
+        transaction_data.description
+    )
+
+async def _fetch_category(transaction_data: CreateTransaction) -> Optional[str]:
+    """Call the categorizer service, returning None if it is unavailable"""
+    category = None
+    start_time = time.perf_counter()
+    try:
+        response = await app.state.categorizer.post(
+            "/categorize",
+            content=orjson.dumps({
+                "merchant": transaction_data.merchant,
+                "amount": transaction_data.amount,
+                "description": transaction_data.description,
+                "transaction_type": transaction_data.transaction_type
+            }),
+            headers=_JSON_HEADERS
+        )
+
+        if response.status_code == 200:
+            record_categorizer_request("success")
+            category = orjson.loads(response.content).get("category", "Other")
+        else:
+            record_categorizer_request("error")
+
+    except Exception as e:
+        record_categorizer_failure()
+        record_categorizer_request("failure")
+        logger.warning("Categorizer service failed: %s", e, extra={
+            "merchant": transaction_data.merchant,
+            "error_type": type(e).__name__,
+            "event_type": "categorizer_error"
+        })
+
+    duration = time.perf_counter() - start_time
+    record_categorizer_latency(duration)
+    log_categorizer_request(
+        logger=logger,
+        merchant=transaction_data.merchant,
+        amount=transaction_data.amount,
+        category=category or "Other",
+        duration_ms=duration * 1000,
+        success=category is not None
+    )
+    return category
+
+async def categorize_transaction(transaction_data: CreateTransaction) -> Optional[str]:
+    """Get a transaction's category, coalescing concurrent misses for the same key"""
+    # The categorizer files every credit under Income before looking at anything else
+    if transaction_data.transaction_type == TransactionType.CREDIT:
+        return "Income"
+
+    key = _category_cache_key(transaction_data)
+    category = _category_cache.get(key)
+    if category is not None:
+        record_categorizer_cache_hit()
+        return category
+    if key in _category_failures:
+        return None
+
+    inflight = _category_inflight.get(key)
+    if inflight is not None:
+        # Shield so a cancelled waiter doesn't cancel the shared lookup
+        return await asyncio.shield(inflight)
+
+    future = asyncio.get_running_loop().create_future()
+    _category_inflight[key] = future
+    try:
+        category = await _fetch_category(transaction_data)
+        if category is not None:
+            _category_cache[key] = category
+        else:
+            _category_failures[key] = True
+    finally:
+        del _category_inflight[key]
+        # Waiters fall back to "Other" if this lookup failed or was cancelled
+        future.set_result(category)
+    return category
+
+
+# List serializers for the high-volume endpoints; their rows are already trusted
+_ACCOUNT_LIST = TypeAdapter(List[AccountResponse])
+_TRANSACTION_LIST = TypeAdapter(List[TransactionResponse])
+_TOPUP_RULE_LIST = TypeAdapter(List[TopUpRuleResponse])
+_TOPUP_EVENT_LIST = TypeAdapter(List[TopUpEventResponse])
+
+def ensure_account_found(results: list, account_id: Optional[int], user_id: int, session: Session):
+    """404 for an account filter the user doesn't own.
+
+    User-scoped queries already exclude other users' rows, so this only costs a
+    lookup when the filtered result is empty.
+    """
+    if account_id and not results and not db.get_account_by_user(account_id, user_id, session=session):
+        raise HTTPException(status_code=404, detail="Account not found")
+
 
 @app.get("/")
 async def root():
     return {"message": "Monzo Demo API"}
 
 @app.get("/accounts", response_model=List[AccountResponse])
-async def get_accounts(current_user: User = Depends(get_current_user)):
-    return db.get_accounts_by_user(current_user.id)
+def get_accounts(current_user: User = Depends(get_current_user),
+                        session: Session = Depends(get_database)):
+    accounts = db.get_accounts_by_user(current_user.id, session=session)
+    return Response(content=_ACCOUNT_LIST.dump_json(accounts), media_type="application/json")
 
 @app.get("/accounts/{account_id}", response_model=AccountResponse)
-async def get_account(account_id: int, current_user: User = Depends(get_current_user)):
-    account = db.get_account_by_user(account_id, current_user.id)
+def get_account(account_id: int, current_user: User = Depends(get_current_user),
+                        session: Session = Depends(get_database)):
+    account = db.get_account_by_user(account_id, current_user.id, session=session)
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
     return account
 
 @app.get("/transactions", response_model=List[TransactionResponse])
-async def get_transactions(account_id: int = None, current_user: User = Depends(get_current_user)):
-    if account_id:
-        account = db.get_account_by_user(account_id, current_user.id)
-        if not account:
-            raise HTTPException(status_code=404, detail="Account not found")
-    user_accounts = db.get_accounts_by_user(current_user.id)
-    user_account_ids = [acc.id for acc in user_accounts]
-    all_transactions = db.get_transactions(account_id)
-    return [t for t in all_transactions if t.account_id in user_account_ids]
+def get_transactions(account_id: int = None, limit: int = Query(50, ge=1, le=500),
+                        before_ts: Optional[datetime] = None, before_id: Optional[int] = None,
+                        current_user: User = Depends(get_current_user),
+                        session: Session = Depends(get_database)):
+    """List the user's transactions newest first, a page at a time (pass the last row's timestamp and id
+    as before_ts and before_id)"""
+    transactions = db.get_transactions_for_user(current_user.id, account_id, limit=limit, before_ts=before_ts,
+                                                before_id=before_id, session=session)
+    ensure_account_found(transactions, account_id, current_user.id, session)
+    # Rows are already trusted; serialize straight to JSON bytes, skipping response_model validation
+    return Response(content=_TRANSACTION_LIST.dump_json(transactions), media_type="application/json")
 
 @app.post("/transactions", response_model=TransactionResponse)
-async def create_transaction(transaction_data: CreateTransaction, current_user: User = Depends(get_current_user)):
-    # Validate account access
-    account = db.get_account_by_user(transaction_data.account_id, current_user.id)
-    if not account:
+async def create_transaction(transaction_data: CreateTransaction, background_tasks: BackgroundTasks,
+                        current_user: User = Depends(get_current_user),
+                        session: Session = Depends(get_database)):
+    now = datetime.now(timezone.utc)
+
+    # Start categorizing (Go microservice or cache) while a non-locking ownership read runs,
+    # then await it before the balance update so the row lock never spans the HTTP round trip
+    categorize_task = asyncio.create_task(categorize_transaction(transaction_data))
+    try:
+        account = await asyncio.to_thread(
+            db.get_account_by_user, transaction_data.account_id, current_user.id, session=session
+        )
+    except BaseException:
+        categorize_task.cancel()
+        raise
+    if account is None:
+        categorize_task.cancel()
         raise HTTPException(status_code=404, detail="Account not found")
 
-    # Get category from Go microservice with metrics tracking
-    category = "Other"
-    categorizer_success = False
-
-    try:
-        with track_categorizer_duration():
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{CATEGORIZER_URL}/categorize",
-                    json={
-                        "merchant": transaction_data.merchant,
-                        "amount": transaction_data.amount,
-                        "description": transaction_data.description,
-                        "transaction_type": transaction_data.transaction_type
-                    },
-                    timeout=5.0
-                )
-
-                if response.status_code == 200:
-                    category = response.json().get("category", "Other")
-                    categorizer_success = True
-                    record_categorizer_request("success")
-                else:
-                    record_categorizer_request("error")
+    category = await categorize_task
+    if category is None:
+        category = "Other"
 
-    except Exception as e:
-        record_categorizer_failure()
-        record_categorizer_request("failure")
-        logger.warning(f"Categorizer service failed: {str(e)}", extra={
-            "merchant": transaction_data.merchant,
-            "error_type": type(e).__name__,
-            "event_type": "categorizer_error"
-        })
+    delta = transaction_data.amount
+    if transaction_data.transaction_type == TransactionType.DEBIT:
+        delta = -delta
 
-    # Log categorizer request
-    log_categorizer_request(
-        logger=logger,
-        merchant=transaction_data.merchant,
-        amount=transaction_data.amount,
-        category=category,
-        duration_ms=0,  # Duration tracked separately by context manager
-        success=categorizer_success
+    # Update account balance; the update still only matches an account the user owns
+    new_balance = await asyncio.to_thread(
+        db.debit_or_credit, transaction_data.account_id, current_user.id, delta, session=session
     )
+    if new_balance is None:
+        raise HTTPException(status_code=404, detail="Account not found")
 
     # Create transaction
     transaction = Transaction(
@@ -232,60 +378,51 @@ async def create_transaction(transaction_data: CreateTransaction, current_user:
         description=transaction_data.description,
         category=category,
         transaction_type=transaction_data.transaction_type,
-        timestamp=datetime.now()
+        timestamp=now
     )
 
-    # Update account balance
-    new_balance = account.balance
-    if transaction_data.transaction_type == TransactionType.DEBIT:
-        new_balance -= transaction_data.amount
-    else:
-        new_balance += transaction_data.amount
-
     # Save to database
-    db.update_account_balance(transaction_data.account_id, new_balance)
-    created_transaction = db.add_transaction(transaction)
+    created_transaction = await asyncio.to_thread(save_transaction, transaction, session)
+
+    # Check for auto topup after the response has been sent
+    background_tasks.add_task(run_topup_check, transaction_data.account_id, now, new_balance)
 
     # Record metrics
     record_transaction(
-        transaction_type=transaction_data.transaction_type,
-        account_id=str(account.id),
+        transaction_type=transaction_data.transaction_type.value,
         category=category
     )
+    record_balance_change(delta)
 
     # Log transaction creation
     log_transaction_created(
         logger=logger,
         user_id=str(current_user.id),
-        account_id=str(account.id),
+        account_id=str(transaction_data.account_id),
         transaction_id=str(created_transaction.id),
         amount=transaction_data.amount,
         category=category,
         merchant=transaction_data.merchant
     )
 
-    # Check for auto topup
-    await check_and_trigger_topup(transaction_data.account_id)
+    return created_transaction
 
+def save_transaction(transaction: Transaction, session: Session) -> Transaction:
+    """Insert the transaction and commit the request's unit of work"""
+    created_transaction = db.add_transaction(transaction, session=session)
+    session.commit()
     return created_transaction
 
 @app.get("/topup-rules", response_model=List[TopUpRuleResponse])
-async def get_topup_rules(account_id: int = None, current_user: User = Depends(get_current_user)):
-    if account_id:
-        account = db.get_account_by_user(account_id, current_user.id)
-        if not account:
-            raise HTTPException(status_code=404, detail="Account not found")
-    user_accounts = db.get_accounts_by_user(current_user.id)
-    user_account_ids = [acc.id for acc in user_accounts]
-    all_rules = db.get_topup_rules(account_id)
-    return [r for r in all_rules if r.account_id in user_account_ids]
+def get_topup_rules(account_id: int = None, current_user: User = Depends(get_current_user),
+                        session: Session = Depends(get_database)):
+    rules = db.get_topup_rules_for_user(current_user.id, account_id, session=session)
+    ensure_account_found(rules, account_id, current_user.id, session)
+    return Response(content=_TOPUP_RULE_LIST.dump_json(rules), media_type="application/json")
 
 @app.post("/topup-rules", response_model=TopUpRuleResponse)
-async def create_topup_rule(rule_data: CreateTopUpRule, current_user: User = Depends(get_current_user)):
-    account = db.get_account_by_user(rule_data.account_id, current_user.id)
-    if not account:
-        raise HTTPException(status_code=404, detail="Account not found")
-
+def create_topup_rule(rule_data: CreateTopUpRule, current_user: User = Depends(get_current_user),
+                        session: Session = Depends(get_database)):
     rule = TopUpRule(
         account_id=rule_data.account_id,
         threshold=rule_data.threshold,
@@ -293,71 +430,128 @@ async def create_topup_rule(rule_data: CreateTopUpRule, current_user: User = Dep
         enabled=True
     )
 
-    return db.add_topup_rule(rule)
+    # The insert only matches an account the user owns, so this doubles as the access check
+    created_rule = db.add_topup_rule_for_user(rule, current_user.id, session=session)
+    if not created_rule:
+        raise HTTPException(status_code=404, detail="Account not found")
+    session.commit()
+    forget_topup_threshold(created_rule.account_id)
+    return created_rule
 
 @app.get("/topup-events", response_model=List[TopUpEventResponse])
-async def get_topup_events(account_id: int = None, current_user: User = Depends(get_current_user)):
-    if account_id:
-        account = db.get_account_by_user(account_id, current_user.id)
-        if not account:
-            raise HTTPException(status_code=404, detail="Account not found")
-    user_accounts = db.get_accounts_by_user(current_user.id)
-    user_account_ids = [acc.id for acc in user_accounts]
-    all_events = db.get_topup_events(account_id)
-    return [e for e in all_events if e.account_id in user_account_ids]
+def get_topup_events(account_id: int = None, limit: int = Query(50, ge=1, le=500),
+                        before_ts: Optional[datetime] = None, before_id: Optional[int] = None,
+                        current_user: User = Depends(get_current_user),
+                        session: Session = Depends(get_database)):
+    """List the user's topup events newest first, a page at a time (pass the last row's timestamp and id
+    as before_ts and before_id)"""
+    events = db.get_topup_events_for_user(current_user.id, account_id, limit=limit, before_ts=before_ts,
+                                          before_id=before_id, session=session)
+    ensure_account_found(events, account_id, current_user.id, session)
+    return Response(content=_TOPUP_EVENT_LIST.dump_json(events), media_type="application/json")
 
 @app.post("/trigger-topup")
-async def manual_trigger_topup(account_id: int, current_user: User = Depends(get_current_user)):
-    account = db.get_account_by_user(account_id, current_user.id)
+def manual_trigger_topup(account_id: int, current_user: User = Depends(get_current_user),
+                        session: Session = Depends(get_database)):
+    account = db.get_account_by_user(account_id, current_user.id, session=session)
     if not account:
         raise HTTPException(status_code=404, detail="Account not found")
 
-    result = await check_and_trigger_topup(account_id)
+    result = check_and_trigger_topup(account_id, session)
+    session.commit()
+    record_topup_metrics(result)
     return {"triggered": result["triggered"], "message": result["message"]}
 
-async def check_and_trigger_topup(account_id: int):
-    account = db.get_account(account_id)
+# Highest enabled rule threshold per account (None when there are no rules). Balances at
+# or above it can't trigger a topup, so most checks never touch the database.
+_topup_thresholds: TTLCache = TTLCache(maxsize=10000, ttl=60)
+# Background checks run in the threadpool, and TTLCache isn't thread-safe
+_topup_thresholds_lock = threading.Lock()
+
+def topup_threshold(account_id: int) -> Optional[float]:
+    with _topup_thresholds_lock:
+        if account_id in _topup_thresholds:
+            return _topup_thresholds[account_id]
+    threshold = db.get_max_topup_threshold(account_id)
+    with _topup_thresholds_lock:
+        _topup_thresholds[account_id] = threshold
+    return threshold
+
+def forget_topup_threshold(account_id: int):
+    with _topup_thresholds_lock:
+        _topup_thresholds.pop(account_id, None)
+
+def run_topup_check(account_id: int, now: Optional[datetime] = None, balance: Optional[float] = None):
+    """Background auto topup check; uses its own session since the request's is closed.
+
+    balance (the post-transaction balance) only decides whether the check can be skipped;
+    whether to top up is decided on the balance re-read under the account row lock.
+    """
+    if balance is not None:
+        threshold = topup_threshold(account_id)
+        if threshold is None or balance >= threshold:
+            return
+
+    session = SessionLocal()
+    try:
+        result = check_and_trigger_topup(account_id, session, now=now)
+        session.commit()
+        record_topup_metrics(result)
+    except Exception:
+        session.rollback()
+        logger.exception("Auto topup check failed", extra={"account_id": str(account_id)})
+    finally:
+        session.close()
+
+def record_topup_metrics(result: dict):
+    """Count a topup from check_and_trigger_topup; call only once its transaction has committed"""
+    event = result.get("event")
+    if event is not None:
+        record_topup()
+        record_balance_change(event.amount)
+
+def check_and_trigger_topup(account_id: int, session: Session, now: Optional[datetime] = None):
+    """Apply the account's triggered topup rule, if any, in the caller's session.
+
+    The caller commits, then passes the result to record_topup_metrics.
+    """
+    # Locks the account row until the caller commits, so the balance can't change underneath us
+    account, rule = db.get_account_with_triggered_rule(account_id, session=session)
     if not account:
         return {"triggered": False, "message": "Account not found"}
 
-    rules = db.get_topup_rules(account_id)
-    enabled_rules = [r for r in rules if r.enabled]
-
-    for rule in enabled_rules:
-        if account.balance < rule.threshold:
-            # Trigger topup
-            new_balance = account.balance + rule.topup_amount
-            db.update_account_balance(account_id, new_balance)
-
-            # Create topup event
-            event = TopUpEvent(
-                account_id=account_id,
-                amount=rule.topup_amount,
-                triggered_balance=account.balance,
-                timestamp=datetime.now()
-            )
-            created_event = db.add_topup_event(event)
-
-            # Record metrics
-            record_topup(str(account_id))
-
-            # Log topup trigger
-            log_topup_triggered(
-                logger=logger,
-                user_id=str(account.user_id),
-                account_id=str(account_id),
-                amount=rule.topup_amount,
-                triggered_balance=account.balance,
-                rule_id=str(rule.id)
-            )
-
-            return {
-                "triggered": True,
-                "message": f"TopUp of ${rule.topup_amount:,.2f} triggered. New balance: ${new_balance:,.2f}"
-            }
-
-    return {"triggered": False, "message": "No topup rules triggered"}
+    if not rule:
+        return {"triggered": False, "message": "No topup rules triggered"}
+
+    # Trigger topup
+    new_balance = db.apply_balance_delta(account_id, rule.topup_amount, session=session)
+
+    # Create topup event
+    event = TopUpEvent(
+        account_id=account_id,
+        amount=rule.topup_amount,
+        triggered_balance=account.balance,
+        timestamp=now or datetime.now(timezone.utc)
+    )
+    created_event = db.add_topup_event(event, session=session)
+
+    # Log topup trigger
+    log_topup_triggered(
+        logger=logger,
+        user_id=str(account.user_id),
+        account_id=str(account_id),
+        amount=rule.topup_amount,
+        triggered_balance=account.balance,
+        rule_id=str(rule.id)
+    )
+
+    return {
+        "triggered": True,
+        "message": f"TopUp of ${rule.topup_amount:,.2f} triggered. New balance: ${new_balance:,.2f}",
+        "event": created_event
+    }
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    # Same event loop and HTTP parser as the Dockerfile; fail loudly if they're missing
+    uvicorn.run(app, host="0.0.0.0", port=8000, loop="uvloop", http="httptools")
@@ -1,6 +1,7 @@
-from prometheus_client import Counter, Histogram, Gauge, CollectorRegistry, generate_latest
+from prometheus_client import Counter, Histogram, Gauge, CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST
 import time
-from typing import Dict, Any
+from collections import defaultdict
+from typing import Dict, Any, List, Tuple
 from contextlib import contextmanager
 
 # Create a registry for our metrics
@@ -10,7 +11,8 @@ registry = CollectorRegistry()
 transactions_total = Counter(
     'transactions_total',
     'Total number of transactions created',
-    ['transaction_type', 'account_id', 'category'],
+    # No account_id label: one series per account would grow without bound
+    ['transaction_type', 'category'],
     registry=registry
 )
 
@@ -18,7 +20,6 @@ transactions_total = Counter(
 topups_triggered_total = Counter(
     'topups_triggered_total',
     'Total number of topups triggered',
-    ['account_id'],
     registry=registry
 )
 
@@ -51,6 +52,12 @@ categorizer_failures_total = Counter(
     registry=registry
 )
 
+categorizer_cache_hits_total = Counter(
+    'categorizer_cache_hits_total',
+    'Total number of categorizations served from the local cache',
+    registry=registry
+)
+
 categorizer_latency_seconds = Histogram(
     'categorizer_latency_seconds',
     'Categorizer service response time in seconds',
@@ -92,58 +99,74 @@ account_balance_total = Gauge(
     registry=registry
 )
 
+# Labelled children already looked up, keyed by their label values. labels() hashes
+# and locks on every call; a plain dict hit is much cheaper on the request path.
+_api_request_children: Dict[Tuple, Any] = {}
+_api_duration_children: Dict[Tuple, Any] = {}
+_transaction_children: Dict[Tuple, Any] = {}
+_categorizer_request_children: Dict[Tuple, Any] = {}
+
+def _bound_child(metric, children: Dict[Tuple, Any], *label_values):
+    """Get the metric's child for these label values, remembering it for next time"""
+    child = children.get(label_values)
+    if child is None:
+        child = children[label_values] = metric.labels(*label_values)
+    return child
+
 @contextmanager
 def track_request_duration(method: str, endpoint: str):
     """Context manager to track request duration"""
-    start_time = time.time()
-    try:
-        yield
-    finally:
-        duration = time.time() - start_time
-        api_request_duration_seconds.labels(method=method, endpoint=endpoint).observe(duration)
-
-@contextmanager
-def track_categorizer_duration():
-    """Context manager to track categorizer service duration"""
-    start_time = time.time()
+    start_time = time.perf_counter()
     try:
         yield
     finally:
-        duration = time.time() - start_time
-        categorizer_latency_seconds.observe(duration)
-
-def get_metrics() -> str:
-    """Get all metrics in Prometheus format"""
-    return generate_latest(registry).decode('utf-8')
-
-def record_transaction(transaction_type: str, account_id: str, category: str):
+        duration = time.perf_counter() - start_time
+        record_api_duration(method, endpoint, duration)
+
+def get_metrics() -> bytes:
+    """Get all metrics in Prometheus format, already encoded for the response body"""
+    return generate_latest(registry)
+
+def get_metric_values() -> Dict[str, List[Tuple[Dict[str, str], float]]]:
+    """Current samples as {sample_name: [(labels, value), ...]}, read from the registry"""
+    values = defaultdict(list)
+    for metric in registry.collect():
+        for sample in metric.samples:
+            values[sample.name].append((sample.labels, sample.value))
+    return values
+
+def record_transaction(transaction_type: str, category: str):
     """Record a transaction creation"""
-    transactions_total.labels(
-        transaction_type=transaction_type,
-        account_id=account_id,
-        category=category
-    ).inc()
+    _bound_child(transactions_total, _transaction_children, transaction_type, category).inc()
 
-def record_topup(account_id: str):
+def record_topup():
     """Record a topup trigger"""
-    topups_triggered_total.labels(account_id=account_id).inc()
+    topups_triggered_total.inc()
 
 def record_api_request(method: str, endpoint: str, status_code: int):
     """Record an API request"""
-    api_requests_total.labels(
-        method=method,
-        endpoint=endpoint,
-        status_code=str(status_code)
-    ).inc()
+    _bound_child(api_requests_total, _api_request_children, method, endpoint, str(status_code)).inc()
+
+def record_api_duration(method: str, endpoint: str, duration: float):
+    """Record an API request's latency in seconds"""
+    _bound_child(api_request_duration_seconds, _api_duration_children, method, endpoint).observe(duration)
 
 def record_categorizer_request(status: str):
     """Record a categorizer service request"""
-    categorizer_requests_total.labels(status=status).inc()
+    _bound_child(categorizer_requests_total, _categorizer_request_children, status).inc()
 
 def record_categorizer_failure():
     """Record a categorizer service failure"""
     categorizer_failures_total.inc()
 
+def record_categorizer_cache_hit():
+    """Record a categorization served without calling the categorizer"""
+    categorizer_cache_hits_total.inc()
+
+def record_categorizer_latency(duration: float):
+    """Record a categorizer call's response time in seconds"""
+    categorizer_latency_seconds.observe(duration)
+
 def record_auth_attempt(auth_type: str, status: str):
     """Record an authentication attempt"""
     auth_attempts_total.labels(type=auth_type, status=status).inc()
@@ -164,6 +187,15 @@ def update_total_balance(balance: float):
     """Update total balance gauge"""
     account_balance_total.set(balance)
 
+def record_accounts_created(count: int, opening_balance: float):
+    """Add newly created accounts to the account gauges"""
+    accounts_total.inc(count)
+    account_balance_total.inc(opening_balance)
+
+def record_balance_change(delta: float):
+    """Apply a committed balance change to the total balance gauge"""
+    account_balance_total.inc(delta)
+
 def update_active_connections(count: int):
     """Update active database connections"""
     database_connections_active.set(count)
@@ -173,27 +205,22 @@ def seed_metrics_from_database():
     try:
         from database.repository import db
         
-        # Get all existing transactions and recreate their metrics
-        transactions = db.get_all_transactions()
-        for transaction in transactions:
-            record_transaction(
-                transaction_type=transaction.transaction_type,
-                account_id=str(transaction.account_id),
-                category=transaction.category or "Other"
-            )
+        # Recreate the counters from per-label aggregates rather than row by row
+        transaction_count = 0
+        for transaction_type, category, count in db.get_transaction_counts():
+            transactions_total.labels(transaction_type=transaction_type, category=category).inc(count)
+            transaction_count += count
         
-        # Get all existing topup events and recreate their metrics
-        topup_events = db.get_topup_events()
-        for event in topup_events:
-            record_topup(str(event.account_id))
+        topup_count = db.count_topup_events()
+        topups_triggered_total.inc(topup_count)
         
-        # Update current account and balance gauges
-        accounts = db.get_accounts()
-        update_accounts_count(len(accounts))
-        total_balance = sum(acc.balance for acc in accounts)
+        # Baseline for the account gauges; from here on they are kept up to date as
+        # accounts are created and balances change
+        accounts_count, total_balance = db.get_accounts_summary()
+        update_accounts_count(accounts_count)
         update_total_balance(total_balance)
         
-        print(f"Seeded Prometheus metrics: {len(transactions)} transactions, {len(topup_events)} topups, {len(accounts)} accounts")
+        print(f"Seeded Prometheus metrics: {transaction_count} transactions, {topup_count} topups, {accounts_count} accounts")
         
     except Exception as e:
         print(f"Warning: Failed to seed metrics from database: {e}")
@@ -1,10 +1,12 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 from typing import List, Optional
 from datetime import datetime
 from enum import Enum
 import uuid
 
 class Account(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     uuid: str  # UUID as string for JSON serialization
     name: str
@@ -21,6 +23,8 @@ class TransactionType(str, Enum):
     CREDIT = "credit"
 
 class Transaction(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     account_id: int
     amount: float
@@ -38,6 +42,8 @@ class CreateTransaction(BaseModel):
     transaction_type: TransactionType
 
 class TopUpRule(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     account_id: int
     threshold: float
@@ -50,6 +56,8 @@ class CreateTopUpRule(BaseModel):
     topup_amount: float
 
 class TopUpEvent(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     account_id: int
     amount: float
@@ -66,6 +74,8 @@ class CategorizationResponse(BaseModel):
 
 # Auth Models
 class User(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+
     id: int
     email: str
     name: str
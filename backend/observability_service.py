@@ -3,162 +3,196 @@ Centralized observability service for handling all metrics collection.
 This service ensures we use only Prometheus data and eliminates duplicate database calls.
 """
 
+import asyncio
+import os
+import time
 import httpx
-from typing import Dict, List, Optional, Tuple
+from prometheus_client.parser import text_string_to_metric_families
+from collections import Counter, defaultdict
+from operator import itemgetter
+from typing import Callable, Dict, List, Optional, Tuple
 from datetime import datetime, timezone
 import logging
-from metrics import get_metrics, update_accounts_count, update_total_balance
-from database.repository import db
+from metrics import get_metric_values
 
 logger = logging.getLogger("observability")
 
+# Seconds that metrics snapshots are reused across scrapes; 0 disables caching
+METRICS_CACHE_TTL = float(os.getenv("METRICS_CACHE_TTL", "10"))
+
+# Base hourly distribution (business hours pattern), indexed by hour of day
+HOURLY_PATTERN = (
+    # Night hours (0-5)
+    0.5, 0.3, 0.2, 0.2, 0.3, 0.8,
+    # Morning (6-8)
+    2.5, 4.0, 6.0,
+    # Business hours (9-17)
+    10.0, 12.0, 14.0, 15.0, 14.0, 13.0, 12.0, 11.0, 10.0,
+    # Evening (18-23)
+    8.0, 6.0, 4.0, 3.0, 2.0, 1.0,
+)
+# Each hour's share of the day, precomputed once rather than per request
+HOURLY_SHARE = tuple(weight / sum(HOURLY_PATTERN) for weight in HOURLY_PATTERN)
+
+# Chart colors for the category breakdown
+CATEGORY_COLORS = {
+    'Food & Drink': '#ff6b6b',
+    'Transport': '#4ecdc4',
+    'Shopping': '#45b7d1',
+    'Groceries': '#96ceb4',
+    'Entertainment': '#ffeaa7',
+    'Bills & Utilities': '#dda0dd',
+    'Housing': '#fab1a0',
+    'Income': '#00b894',
+    'ATM': '#a29bfe',
+    'Transfer': '#6c5ce7',
+    'Other': '#6c5ce7'
+}
+
+# The dashboard waits on this fetch, so keep it short and fall back to the last good scrape
+CATEGORIZER_METRICS_TIMEOUT = httpx.Timeout(0.5, connect=0.2)
+CATEGORIZER_METRICS_MAX_STALENESS = 60  # seconds
+
 class ObservabilityService:
     """Centralized service for collecting and processing observability data"""
     
     def __init__(self):
-        self.categorizer_url = "http://categorizer:9000"
-        self._cache = {}
-        self._cache_ttl = {}
-        self.cache_duration = 30  # 30 seconds
+        # Shared pooled client, handed over by the app on startup
+        self.client: Optional[httpx.AsyncClient] = None
+        # key -> (expires_at on the monotonic clock, value)
+        self._cache: Dict[str, Tuple[float, object]] = {}
+        self.cache_duration = METRICS_CACHE_TTL
+        # Serializes refills so concurrent scrapers don't all hit the DB and categorizer
+        self._refill_lock = asyncio.Lock()
+        # Last successfully fetched categorizer samples and when they were fetched
+        self._last_categorizer: Tuple[float, Dict] = (0.0, {})
+        self._categorizer_stale = False
+        # Payloads built from the cached samples, as {key: (samples, payload)}
+        self._derived_cache: Dict[str, Tuple[Tuple[Dict, Dict], Dict]] = {}
     
-    def _is_cache_valid(self, key: str) -> bool:
-        """Check if cached data is still valid"""
-        if key not in self._cache_ttl:
-            return False
-        return (datetime.now().timestamp() - self._cache_ttl[key]) < self.cache_duration
+    def _get_cache(self, key: str):
+        """Get a cached value, or None if it is missing or expired"""
+        entry = self._cache.get(key)
+        if entry is None or entry[0] <= time.monotonic():
+            return None
+        return entry[1]
     
     def _set_cache(self, key: str, value):
-        """Set cache value with timestamp"""
-        self._cache[key] = value
-        self._cache_ttl[key] = datetime.now().timestamp()
+        """Set cache value, expiring cache_duration seconds from now"""
+        self._cache[key] = (time.monotonic() + self.cache_duration, value)
     
-    async def _fetch_prometheus_metrics(self) -> Tuple[str, str]:
-        """Fetch Prometheus metrics from both backend and categorizer"""
+    async def _fetch_prometheus_metrics(self) -> Tuple[Dict, Dict]:
+        """Fetch Prometheus samples from both backend and categorizer"""
         cache_key = "prometheus_metrics"
-        if self._is_cache_valid(cache_key):
-            return self._cache[cache_key]
-        
-        # Update gauges before fetching metrics (only once per cache period)
-        await self._update_system_gauges()
-        
-        # Get backend metrics
-        backend_metrics = get_metrics()
+        cached = self._get_cache(cache_key)
+        if cached is not None:
+            return cached
+
+        async with self._refill_lock:
+            # Another caller may have refilled while we waited
+            cached = self._get_cache(cache_key)
+            if cached is not None:
+                return cached
+            return await self._refill_prometheus_metrics(cache_key)
+
+    async def _refill_prometheus_metrics(self, cache_key: str) -> Tuple[Dict, Dict]:
+        """Collect fresh backend and categorizer samples and cache them"""
+        # Backend samples come straight from our own registry, no text round trip
+        backend_samples = get_metric_values()
         
         # Fetch categorizer metrics
-        categorizer_metrics = ""
+        categorizer_samples = None
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{self.categorizer_url}/metrics", timeout=5.0)
-                if response.status_code == 200:
-                    categorizer_metrics = response.text
+            response = await self.client.get("/metrics", timeout=CATEGORIZER_METRICS_TIMEOUT)
+            if response.status_code == 200:
+                categorizer_samples = self._index_samples(response.text)
         except Exception as e:
-            logger.warning(f"Failed to fetch categorizer metrics: {str(e)}")
+            logger.warning("Failed to fetch categorizer metrics: %s", e)
+
+        self._categorizer_stale = False
+        if categorizer_samples is not None:
+            self._last_categorizer = (time.monotonic(), categorizer_samples)
+        else:
+            fetched_at, last_samples = self._last_categorizer
+            if last_samples and time.monotonic() - fetched_at < CATEGORIZER_METRICS_MAX_STALENESS:
+                categorizer_samples = last_samples
+                self._categorizer_stale = True
+            else:
+                categorizer_samples = {}
         
-        result = (backend_metrics, categorizer_metrics)
+        result = (backend_samples, categorizer_samples)
         self._set_cache(cache_key, result)
         return result
     
-    async def _update_system_gauges(self):
-        """Update system-wide gauge metrics (cached to avoid repeated DB calls)"""
-        cache_key = "system_gauges"
-        if self._is_cache_valid(cache_key):
-            return
-        
-        # Single database call for accounts
-        accounts = db.get_accounts()
-        update_accounts_count(len(accounts))
-        total_balance = sum(acc.balance for acc in accounts)
-        update_total_balance(total_balance)
-        
-        self._set_cache(cache_key, True)
+    def _index_samples(self, exposition: str) -> Dict[str, List[Tuple[Dict[str, str], float]]]:
+        """Parse Prometheus exposition text once into {sample_name: [(labels, value), ...]}"""
+        index = defaultdict(list)
+        try:
+            for family in text_string_to_metric_families(exposition):
+                for sample in family.samples:
+                    index[sample.name].append((sample.labels, sample.value))
+        except ValueError as e:
+            # Keep whatever parsed before the malformed line
+            logger.warning("Failed to parse categorizer metrics: %s", e)
+        return index
     
-    def _extract_histogram_average(self, lines: List[str], metric_name: str) -> float:
+    def _extract_histogram_average(self, index: Dict, metric_name: str) -> float:
         """Extract average from Prometheus histogram sum/count"""
-        sum_value = 0.0
-        count_value = 0.0
-        
-        for line in lines:
-            if line.startswith(f"{metric_name}_sum"):
-                try:
-                    sum_value += float(line.split()[-1])
-                except (IndexError, ValueError):
-                    continue
-            elif line.startswith(f"{metric_name}_count"):
-                try:
-                    count_value += float(line.split()[-1])
-                except (IndexError, ValueError):
-                    continue
+        sum_value = self._extract_counter_by_label(index, f"{metric_name}_sum")
+        count_value = self._extract_counter_by_label(index, f"{metric_name}_count")
         
         if count_value > 0:
             return sum_value / count_value
         return 0.0
     
-    def _extract_metric_value(self, lines: List[str], metric_name: str) -> float:
+    def _extract_metric_value(self, index: Dict, metric_name: str) -> float:
         """Extract simple metric value"""
-        for line in lines:
-            if line.startswith(metric_name) and not line.startswith(f"{metric_name}_"):
-                try:
-                    return float(line.split()[-1])
-                except (IndexError, ValueError):
-                    continue
-        return 0.0
+        samples = index.get(metric_name)
+        return samples[0][1] if samples else 0.0
     
-    def _extract_counter_by_label(self, lines: List[str], metric_name: str, label_filters: Dict[str, str] = None) -> float:
+    def _extract_counter_by_label(self, index: Dict, metric_name: str, label_filters: Dict[str, str] = None) -> float:
         """Extract counter value with optional label filtering"""
-        total = 0.0
-        for line in lines:
-            if line.startswith(metric_name) and "{" in line:
-                if label_filters:
-                    # Check if all label filters match
-                    if all(f'{key}="{value}"' in line for key, value in label_filters.items()):
-                        try:
-                            total += float(line.split()[-1])
-                        except (IndexError, ValueError):
-                            continue
-                else:
-                    try:
-                        total += float(line.split()[-1])
-                    except (IndexError, ValueError):
-                        continue
-        return total
+        samples = index.get(metric_name, ())
+        if not label_filters:
+            return sum((value for _, value in samples), 0.0)
+        return sum(
+            (value for labels, value in samples
+             if all(labels.get(key) == expected for key, expected in label_filters.items())),
+            0.0
+        )
     
-    def _parse_prometheus_metrics(self, backend_metrics: str, categorizer_metrics: str) -> Dict:
+    def _parse_prometheus_metrics(self, backend_samples: Dict, categorizer_samples: Dict) -> Dict:
         """Parse Prometheus metrics into structured format"""
         metrics = {
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": datetime.now(),  # ORJSONResponse encodes datetimes itself
             "backend": {},
             "categorizer": {},
-            "summary": {}
+            "summary": {},
+            # True when the categorizer section is from an earlier scrape
+            "stale": self._categorizer_stale
         }
         
-        # Parse backend metrics
-        backend_lines = backend_metrics.strip().split('\n')
-        backend_lines = [line for line in backend_lines if not line.startswith('#') and line.strip()]
-        
         # Calculate average response time from histogram
-        avg_response_time_seconds = self._extract_histogram_average(backend_lines, "api_request_duration_seconds")
+        avg_response_time_seconds = self._extract_histogram_average(backend_samples, "api_request_duration_seconds")
         avg_response_time_ms = avg_response_time_seconds * 1000
         
         metrics["backend"] = {
-            "transactions_total": self._extract_counter_by_label(backend_lines, "transactions_total"),
-            "topups_triggered_total": self._extract_metric_value(backend_lines, "topups_triggered_total"),
-            "api_requests_total": self._extract_counter_by_label(backend_lines, "api_requests_total"),
-            "categorizer_requests_success": self._extract_counter_by_label(backend_lines, "categorizer_requests_total", {"status": "success"}),
-            "categorizer_requests_failure": self._extract_counter_by_label(backend_lines, "categorizer_requests_total", {"status": "failure"}),
-            "accounts_count": self._extract_metric_value(backend_lines, "accounts_total"),
-            "total_balance": self._extract_metric_value(backend_lines, "account_balance_total"),
+            "transactions_total": self._extract_counter_by_label(backend_samples, "transactions_total"),
+            "topups_triggered_total": self._extract_counter_by_label(backend_samples, "topups_triggered_total"),
+            "api_requests_total": self._extract_counter_by_label(backend_samples, "api_requests_total"),
+            "categorizer_requests_success": self._extract_counter_by_label(backend_samples, "categorizer_requests_total", {"status": "success"}),
+            "categorizer_requests_failure": self._extract_counter_by_label(backend_samples, "categorizer_requests_total", {"status": "failure"}),
+            "accounts_count": self._extract_metric_value(backend_samples, "accounts_total"),
+            "total_balance": self._extract_metric_value(backend_samples, "account_balance_total"),
             "avg_response_time_ms": avg_response_time_ms
         }
         
         # Parse categorizer metrics
-        if categorizer_metrics:
-            categorizer_lines = categorizer_metrics.strip().split('\n')
-            categorizer_lines = [line for line in categorizer_lines if not line.startswith('#') and line.strip()]
-            
+        if categorizer_samples:
             metrics["categorizer"] = {
-                "categorization_requests_total": self._extract_counter_by_label(categorizer_lines, "categorization_requests_total"),
-                "categorization_errors_total": self._extract_counter_by_label(categorizer_lines, "categorization_errors_total"),
-                "http_requests_total": self._extract_counter_by_label(categorizer_lines, "http_requests_total"),
+                "categorization_requests_total": self._extract_counter_by_label(categorizer_samples, "categorization_requests_total"),
+                "categorization_errors_total": self._extract_counter_by_label(categorizer_samples, "categorization_errors_total"),
+                "http_requests_total": self._extract_counter_by_label(categorizer_samples, "http_requests_total"),
             }
         
         # Calculate summary metrics
@@ -178,110 +212,76 @@ class ObservabilityService:
         
         return metrics
     
+    async def _derived(self, key: str, build: Callable[[Dict, Dict], Dict]) -> Dict:
+        """Build a payload from the current samples, reusing it until the samples are refreshed"""
+        samples = await self._fetch_prometheus_metrics()
+        cached = self._derived_cache.get(key)
+        if cached is not None and cached[0] is samples:
+            return cached[1]
+        result = build(*samples)
+        self._derived_cache[key] = (samples, result)
+        return result
+    
     async def get_metrics(self) -> Dict:
         """Get parsed metrics from Prometheus data"""
-        backend_metrics, categorizer_metrics = await self._fetch_prometheus_metrics()
-        return self._parse_prometheus_metrics(backend_metrics, categorizer_metrics)
+        return await self._derived("metrics", self._parse_prometheus_metrics)
     
     async def get_category_breakdown(self) -> Dict:
         """Get category breakdown from Prometheus transaction counters"""
-        backend_metrics, _ = await self._fetch_prometheus_metrics()
-        backend_lines = backend_metrics.strip().split('\n')
-        backend_lines = [line for line in backend_lines if not line.startswith('#') and line.strip()]
-        
+        return await self._derived("category_breakdown", self._build_category_breakdown)
+    
+    async def get_timeseries_data(self) -> Dict:
+        """Generate time series data from Prometheus metrics"""
+        return await self._derived("timeseries", self._build_timeseries_data)
+    
+    def _build_category_breakdown(self, backend_samples: Dict, categorizer_samples: Dict) -> Dict:
+        """Chart-ready category shares from the transactions_total counter"""
         # Extract category data from transaction counters
-        category_counts = {}
-        total_transactions = 0
-        
-        for line in backend_lines:
-            if line.startswith("transactions_total{") and "category=" in line:
-                try:
-                    # Extract category from label
-                    category_start = line.find('category="') + 10
-                    category_end = line.find('"', category_start)
-                    if category_start > 9 and category_end > category_start:
-                        category = line[category_start:category_end]
-                        count = float(line.split()[-1])
-                        category_counts[category] = category_counts.get(category, 0) + count
-                        total_transactions += count
-                except (ValueError, IndexError):
-                    continue
+        category_counts = Counter()
+        for labels, count in backend_samples.get("transactions_total", ()):
+            category = labels.get("category")
+            if category:
+                category_counts[category] += count
+        total_transactions = sum(category_counts.values())
         
         if total_transactions == 0:
             return {"categories": [], "total_transactions": 0}
         
-        # Color mapping
-        colors = {
-            'Food & Drink': '#ff6b6b',
-            'Transport': '#4ecdc4',
-            'Shopping': '#45b7d1',
-            'Groceries': '#96ceb4',
-            'Entertainment': '#ffeaa7',
-            'Bills & Utilities': '#dda0dd',
-            'Housing': '#fab1a0',
-            'Income': '#00b894',
-            'ATM': '#a29bfe',
-            'Transfer': '#6c5ce7',
-            'Other': '#6c5ce7'
-        }
-        
-        # Convert to chart format
-        categories = []
-        for category, count in category_counts.items():
-            percentage = round((count / total_transactions) * 100, 1)
-            categories.append({
+        # Convert to chart format, sorted by percentage descending
+        categories = [
+            {
                 "name": category,
-                "value": percentage,
+                "value": round((count / total_transactions) * 100, 1),
                 "count": int(count),
-                "color": colors.get(category, '#6c5ce7')
-            })
-        
-        # Sort by percentage descending
-        categories.sort(key=lambda x: x['value'], reverse=True)
+                "color": CATEGORY_COLORS.get(category, '#6c5ce7')
+            }
+            for category, count in category_counts.items()
+        ]
+        categories.sort(key=itemgetter("value"), reverse=True)
         
         return {
             "categories": categories, 
             "total_transactions": int(total_transactions)
         }
     
-    async def get_timeseries_data(self) -> Dict:
-        """Generate time series data from Prometheus metrics"""
-        backend_metrics, _ = await self._fetch_prometheus_metrics()
-        backend_lines = backend_metrics.strip().split('\n')
-        backend_lines = [line for line in backend_lines if not line.startswith('#') and line.strip()]
-        
+    def _build_timeseries_data(self, backend_samples: Dict, categorizer_samples: Dict) -> Dict:
+        """Spread the backend counter totals over the last 24 hours"""
         # Get base metrics for pattern generation
-        total_transactions = self._extract_counter_by_label(backend_lines, "transactions_total")
-        total_api_requests = self._extract_counter_by_label(backend_lines, "api_requests_total")
-        total_categorizer_requests = self._extract_counter_by_label(backend_lines, "categorizer_requests_total")
-        avg_response_time = self._extract_histogram_average(backend_lines, "api_request_duration_seconds") * 1000
+        total_transactions = self._extract_counter_by_label(backend_samples, "transactions_total")
+        total_api_requests = self._extract_counter_by_label(backend_samples, "api_requests_total")
+        total_categorizer_requests = self._extract_counter_by_label(backend_samples, "categorizer_requests_total")
+        avg_response_time = self._extract_histogram_average(backend_samples, "api_request_duration_seconds") * 1000
         
         # Generate realistic hourly distribution based on current metrics
         now = datetime.now(timezone.utc)
         current_hour = now.hour
         time_series = []
         
-        # Base hourly distribution (business hours pattern)
-        hourly_pattern = {
-            # Night hours (0-5)
-            0: 0.5, 1: 0.3, 2: 0.2, 3: 0.2, 4: 0.3, 5: 0.8,
-            # Morning (6-8)
-            6: 2.5, 7: 4.0, 8: 6.0,
-            # Business hours (9-17)
-            9: 10.0, 10: 12.0, 11: 14.0, 12: 15.0, 13: 14.0, 14: 13.0, 15: 12.0, 16: 11.0, 17: 10.0,
-            # Evening (18-23)
-            18: 8.0, 19: 6.0, 20: 4.0, 21: 3.0, 22: 2.0, 23: 1.0
-        }
-        
-        total_weight = sum(hourly_pattern.values())
-        
         for i in range(24):
-            hour_index = (current_hour - 23 + i) % 24
-            hour = hour_index if hour_index >= 0 else hour_index + 24
+            hour = (current_hour - 23 + i) % 24
             
             # Calculate transactions for this hour based on pattern
-            hour_weight = hourly_pattern.get(hour, 1.0)
-            hour_percentage = hour_weight / total_weight
+            hour_percentage = HOURLY_SHARE[hour]
             
             transactions_count = int(total_transactions * hour_percentage)
             api_requests_count = int(total_api_requests * hour_percentage) 
@@ -27,24 +27,28 @@ def seed_demo_data():
             logger.info("Demo data already exists, skipping seeding")
             return
         
+        # Both users share a password, so pay for the bcrypt hash once
+        password_hash = get_password_hash("demo")
+        now = datetime.now()
+        
         # Create demo users (IDs will be auto-generated)
         demo_user = User(
             email="demo@monzo.com",
             name="Demo User",
-            password_hash=get_password_hash("demo"),
-            created_at=datetime.now()
+            password_hash=password_hash,
+            created_at=now
         )
         
         john_user = User(
             email="john@example.com", 
             name="John Doe",
-            password_hash=get_password_hash("demo"),
-            created_at=datetime.now()
+            password_hash=password_hash,
+            created_at=now
         )
         
-        db.add(demo_user)
-        db.add(john_user)
-        db.commit()
+        # Everything below goes in one transaction; flushes just fetch generated IDs
+        db.add_all([demo_user, john_user])
+        db.flush()
         
         # Create demo accounts (use the generated user IDs)
         demo_current = Account(
@@ -65,10 +69,8 @@ def seed_demo_data():
             user_id=john_user.id
         )
         
-        db.add(demo_current)
-        db.add(demo_savings)
-        db.add(john_current)
-        db.commit()
+        db.add_all([demo_current, demo_savings, john_current])
+        db.flush()
         
         # Create sample transactions (use generated account IDs)
         sample_transactions = [
@@ -79,7 +81,7 @@ def seed_demo_data():
                 description="Weekly groceries",
                 category="Shopping",
                 transaction_type="debit",
-                timestamp=datetime.now() - timedelta(days=2)
+                timestamp=now - timedelta(days=2)
             ),
             Transaction(
                 account_id=demo_current.id,
@@ -88,7 +90,7 @@ def seed_demo_data():
                 description="Morning coffee",
                 category="Food & Drink",
                 transaction_type="debit",
-                timestamp=datetime.now() - timedelta(days=1)
+                timestamp=now - timedelta(days=1)
             ),
             Transaction(
                 account_id=demo_current.id,
@@ -97,7 +99,7 @@ def seed_demo_data():
                 description="Monthly salary",
                 category="Income",
                 transaction_type="credit",
-                timestamp=datetime.now() - timedelta(days=5)
+                timestamp=now - timedelta(days=5)
             ),
             Transaction(
                 account_id=demo_savings.id,
@@ -106,12 +108,11 @@ def seed_demo_data():
                 description="Monthly savings",
                 category="Transfer",
                 transaction_type="credit",
-                timestamp=datetime.now() - timedelta(days=1)
+                timestamp=now - timedelta(days=1)
             )
         ]
         
-        for transaction in sample_transactions:
-            db.add(transaction)
+        db.add_all(sample_transactions)
         
         # Create sample topup rules (use generated account IDs)
         topup_rule = TopUpRule(
@@ -128,7 +129,7 @@ def seed_demo_data():
             account_id=demo_current.id,
             amount=100.0,
             triggered_balance=25.50,
-            timestamp=datetime.now() - timedelta(days=3)
+            timestamp=now - timedelta(days=3)
         )
         
         db.add(topup_event)
@@ -137,7 +138,7 @@ def seed_demo_data():
         logger.info("✅ Demo data seeded successfully!")
         
     except Exception as e:
-        logger.error(f"❌ Error seeding demo data: {e}")
+        logger.error("❌ Error seeding demo data: %s", e)
         db.rollback()
         raise
     finally:
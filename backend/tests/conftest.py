@@ -0,0 +1,53 @@
+import os
+import tempfile
+
+# Point the app at TEST_DATABASE_URL, or a throwaway SQLite file, before anything imports database.config
+_db_dir = tempfile.mkdtemp(prefix="monzo-demo-tests-")
+os.environ["DATABASE_URL"] = os.getenv("TEST_DATABASE_URL", f"sqlite:///{_db_dir}/test.db")
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
+import pytest
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.compiler import compiles
+
+from database.config import SessionLocal, engine
+from database.models import Base
+
+
+@compiles(UUID, "sqlite")
+def _uuid_on_sqlite(type_, compiler, **kw):
+    """accounts.uuid is a PostgreSQL UUID; SQLite stores it as text"""
+    return "CHAR(32)"
+
+
+@pytest.fixture
+def session():
+    """A session on freshly created tables, dropped again afterwards"""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture
+def client(session, monkeypatch):
+    """A TestClient on the app, signed in as a freshly signed-up user"""
+    from fastapi.testclient import TestClient
+    from auth import auth
+    import main
+
+    # The fixture already created the tables; skip the Alembic run at startup
+    monkeypatch.setattr(main, "init_database", lambda: None)
+    # Row ids restart with every database, so don't let process-wide caches carry over
+    for cache in (auth._tok_cache, auth._user_cache, main._topup_thresholds, main._category_cache,
+                  main._category_failures):
+        cache.clear()
+    with TestClient(main.app) as test_client:
+        credentials = {"email": "client@example.com", "password": "password", "name": "Client"}
+        test_client.post("/auth/signup", json=credentials)
+        token = test_client.post("/auth/login", json=credentials).json()["access_token"]
+        test_client.headers["Authorization"] = f"Bearer {token}"
+        yield test_client
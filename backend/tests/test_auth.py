@@ -0,0 +1,14 @@
+import time
+from datetime import timedelta
+
+from auth import auth
+
+
+def test_cached_token_is_rejected_once_it_expires(monkeypatch):
+    token = auth.create_access_token({"sub": "expiring@example.com"}, timedelta(seconds=5))
+    assert auth.verify_token(token).email == "expiring@example.com"
+
+    # Still inside the token cache TTL, but past the token's own exp
+    later = time.time() + 10
+    monkeypatch.setattr(auth.time, "time", lambda: later)
+    assert auth.verify_token(token) is None
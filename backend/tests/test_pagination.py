@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta, timezone
+
+from database.models import Account, TopUpEvent, Transaction, User
+from database.repository import db
+
+
+def _add_user_with_account(session):
+    user = User(email="paging@example.com", name="Paging", password_hash="x")
+    account = Account(name="Current", balance=0.0, user=user)
+    session.add_all([user, account])
+    session.flush()
+    return user, account
+
+
+def _page_through(fetch, limit):
+    """Follow the (timestamp, id) cursor until a short page comes back"""
+    rows, cursor = [], {}
+    while True:
+        page = fetch(limit=limit, **cursor)
+        rows.extend(page)
+        if len(page) < limit:
+            return rows
+        cursor = {"before_ts": page[-1].timestamp, "before_id": page[-1].id}
+
+
+def test_transaction_pages_keep_rows_with_tied_timestamps(session):
+    user, account = _add_user_with_account(session)
+    now = datetime.now(timezone.utc)
+    tied = now - timedelta(days=1)
+    for merchant, timestamp in [("Tesco", now), ("Costa Coffee", tied), ("Transfer", tied), ("Rent", tied),
+                                ("Amazon", now - timedelta(days=2))]:
+        session.add(Transaction(account_id=account.id, amount=1.0, merchant=merchant, description="",
+                                category="Other", transaction_type="debit", timestamp=timestamp))
+    session.commit()
+
+    for account_id in (None, account.id):
+        rows = _page_through(
+            lambda **kw: db.get_transactions_for_user(user.id, account_id, session=session, **kw), limit=2
+        )
+        assert [row.merchant for row in rows] == ["Tesco", "Rent", "Transfer", "Costa Coffee", "Amazon"]
+
+
+def test_topup_event_pages_keep_rows_with_tied_timestamps(session):
+    user, account = _add_user_with_account(session)
+    tied = datetime.now(timezone.utc)
+    for amount in (10.0, 20.0, 30.0):
+        session.add(TopUpEvent(account_id=account.id, amount=amount, triggered_balance=0.0, timestamp=tied))
+    session.commit()
+
+    rows = _page_through(lambda **kw: db.get_topup_events_for_user(user.id, session=session, **kw), limit=2)
+    assert [row.amount for row in rows] == [30.0, 20.0, 10.0]
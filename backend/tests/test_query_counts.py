@@ -0,0 +1,43 @@
+from database.config import count_queries
+
+
+def _first_account_id(client):
+    return client.get("/accounts").json()[0]["id"]
+
+
+def test_list_transactions_is_one_query(client):
+    # Resolves and caches the signed-in user, which is otherwise one more query per token
+    _first_account_id(client)
+
+    with count_queries() as queries:
+        response = client.get("/transactions")
+    assert response.status_code == 200
+    assert len(queries) == 1
+
+
+def test_empty_account_filter_adds_only_the_ownership_check(client):
+    account_id = _first_account_id(client)
+
+    with count_queries() as queries:
+        response = client.get("/transactions", params={"account_id": account_id})
+    assert response.json() == []
+    assert len(queries) == 2
+
+
+def test_create_transaction_query_count(client):
+    account_id = _first_account_id(client)
+    # Credits are always "Income", so this never waits on the categorizer service
+    transaction = {"account_id": account_id, "amount": 25.0, "merchant": "Employer",
+                   "description": "Salary", "transaction_type": "credit"}
+
+    # Ownership read, balance UPDATE, transaction INSERT, then the topup threshold lookup...
+    with count_queries() as queries:
+        response = client.post("/transactions", json=transaction)
+    assert response.status_code == 200
+    assert len(queries) == 4
+
+    # ...which is cached, so later transactions on the account skip it
+    with count_queries() as queries:
+        response = client.post("/transactions", json=transaction)
+    assert response.status_code == 200
+    assert len(queries) == 3
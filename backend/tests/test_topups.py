@@ -0,0 +1,50 @@
+from sqlalchemy.orm import Session
+
+import main
+from metrics import topups_triggered_total
+
+
+def _add_triggering_rule(client, threshold=1000):
+    account_id = client.get("/accounts").json()[0]["id"]
+    # New accounts start at 100, below the threshold
+    response = client.post("/topup-rules", json={"account_id": account_id, "threshold": threshold, "topup_amount": 50})
+    assert response.status_code == 200
+    return account_id
+
+
+def test_topup_is_counted_after_commit(client):
+    account_id = _add_triggering_rule(client)
+    before = topups_triggered_total._value.get()
+
+    response = client.post("/trigger-topup", params={"account_id": account_id})
+    assert response.json()["triggered"] is True
+    assert topups_triggered_total._value.get() == before + 1
+
+
+def test_rolled_back_topup_is_not_counted(client, monkeypatch):
+    account_id = _add_triggering_rule(client)
+    before = topups_triggered_total._value.get()
+
+    def failing_commit(self):
+        raise RuntimeError("commit failed")
+
+    with monkeypatch.context() as patched:
+        patched.setattr(Session, "commit", failing_commit)
+        main.run_topup_check(account_id)
+
+    assert topups_triggered_total._value.get() == before
+    assert client.get("/topup-events").json() == []
+
+
+def test_topup_check_rereads_the_balance_instead_of_trusting_the_caller(client):
+    # One topup (100 -> 150) lifts the balance above the threshold
+    account_id = _add_triggering_rule(client, threshold=120)
+
+    # Both checks are handed the same stale pre-topup balance; the second must
+    # see the topped-up balance under the lock and do nothing
+    main.run_topup_check(account_id, balance=100.0)
+    main.run_topup_check(account_id, balance=100.0)
+
+    events = client.get("/topup-events").json()
+    assert len(events) == 1
+    assert client.get(f"/accounts/{account_id}").json()["balance"] == 150.0
@@ -0,0 +1,18 @@
+import asyncio
+
+import main
+
+
+def test_foreign_account_is_rejected_before_categorizing(client, monkeypatch):
+    async def slow_fetch(transaction_data):
+        await asyncio.sleep(5)
+        return "Groceries"
+
+    monkeypatch.setattr(main, "_fetch_category", slow_fetch)
+    response = client.post("/transactions", json={"account_id": 999, "amount": 5.0, "merchant": "Tesco",
+                                                  "description": "food", "transaction_type": "debit"})
+
+    assert response.status_code == 404
+    # The lookup was cancelled, so nothing was cached either way
+    assert len(main._category_cache) == 0
+    assert len(main._category_failures) == 0